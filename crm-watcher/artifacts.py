@@ -0,0 +1,182 @@
+"""
+Отладочные артефакты (скриншоты, маски) — запись на диск в фоне и только если включено.
+
+Хранилище ограничено: одинаковые скриншоты лежат один раз (blobs/<sha1>, в run_artifacts/ — жёсткая ссылка),
+отладочные картинки сжимаются (WebP/JPEG), старые файлы вычищаются по возрасту и суммарному размеру,
+а отметки об отправленных алертах живут в одном alerts.json.
+"""
+
+import os, json, time, asyncio, hashlib, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+ART = ROOT / "run_artifacts"
+BLOBS = ART / "blobs"
+
+# CRM_SAVE_ARTIFACTS=0 — ничего не писать на диск (всё остаётся в памяти)
+SAVE_ARTIFACTS = os.getenv("CRM_SAVE_ARTIFACTS", "1") != "0"
+# Ограничения хранилища
+MAX_MB = float(os.getenv("CRM_ARTIFACT_MAX_MB", "200"))
+MAX_AGE_DAYS = float(os.getenv("CRM_ARTIFACT_MAX_AGE_DAYS", "7"))
+# Формат отладочных картинок: webp | jpg | png
+DEBUG_FORMAT = os.getenv("CRM_DEBUG_FORMAT", "webp")
+DEBUG_QUALITY = int(os.getenv("CRM_DEBUG_QUALITY", "80"))
+
+IMAGE_EXTS = {".png", ".webp", ".jpg"}
+
+_pending = set()
+
+def encode_debug(img):
+    """Отладочная картинка в сжатом формате: (".webp"|".jpg"|".png", байты)"""
+    import cv2
+    params = {"webp": [cv2.IMWRITE_WEBP_QUALITY, DEBUG_QUALITY], "jpg": [cv2.IMWRITE_JPEG_QUALITY, DEBUG_QUALITY], "png": []}
+    for fmt in (DEBUG_FORMAT, "jpg"):
+        try:
+            ok, buf = cv2.imencode(f".{fmt}", img, params.get(fmt, []))
+        except cv2.error:
+            ok = False
+        if ok:
+            return f".{fmt}", buf.tobytes()
+    return ".png", cv2.imencode(".png", img)[1].tobytes()
+
+def _write(path, data):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_bytes(data)
+
+def _write_dedup(path, data):
+    """Содержимое — в blobs/<sha1>, по имени path — жёсткая ссылка (одинаковые кадры не дублируются)"""
+    digest = hashlib.sha1(data).hexdigest()
+    blob = BLOBS / digest[:2] / (digest + Path(path).suffix)
+    if not blob.exists():
+        _write(blob, data)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if path.exists():
+            path.unlink()
+        os.link(blob, path)
+        os.utime(path)       # общий inode: свежий кадр не должен выглядеть старым при чистке
+    except OSError:
+        _write(path, data)   # ФС без жёстких ссылок
+
+def save_async(path, data, dedup=False):
+    """Планирует запись байтов в файл в фоновом потоке; не блокирует мониторинг"""
+    if not SAVE_ARTIFACTS or data is None:
+        return None
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(_write_dedup if dedup else _write, path, data))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+    return task
+
+async def flush():
+    """Дожидается всех запланированных записей (вызывается в конце запуска)"""
+    if _pending:
+        results = await asyncio.gather(*list(_pending), return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                print(f"WARN: artifact write failed: {r}")
+
+def prune(root=ART, max_mb=MAX_MB, max_age_days=MAX_AGE_DAYS):
+    """Удаляет картинки старше max_age_days, затем самые старые — пока всё не влезет в max_mb; чистит blobs"""
+    root = Path(root)
+    if not root.exists():
+        return 0
+    removed = 0
+    # Старые маркеры алертов (до alerts.json): индекс переносит их к себе и удаляет
+    markers = len(list(root.glob("last_alert_*.txt")))
+    if markers:
+        alerts() if root == ART else AlertIndex(root / "alerts.json")
+        removed += markers - len(list(root.glob("last_alert_*.txt")))
+    now = time.time()
+    files = []
+    for p in root.iterdir():
+        if p.is_file() and p.suffix in IMAGE_EXTS:
+            st = p.stat()
+            if now - st.st_mtime > max_age_days * 86400:
+                p.unlink(missing_ok=True); removed += 1
+            else:
+                files.append((st.st_mtime, p, st))
+    # Размер считаем по inode: жёсткие ссылки на один blob — один раз
+    inodes = {}
+    for _, _, st in files:
+        inodes[st.st_ino] = st.st_size
+    total = sum(inodes.values())
+    refs = {}
+    for _, _, st in files:
+        refs[st.st_ino] = refs.get(st.st_ino, 0) + 1
+    for _, p, st in sorted(files, key=lambda f: f[0]):
+        if total <= max_mb * 1024 * 1024:
+            break
+        p.unlink(missing_ok=True); removed += 1
+        refs[st.st_ino] -= 1
+        if refs[st.st_ino] == 0:
+            total -= st.st_size
+    # blobs без ссылок из run_artifacts/
+    if (root / "blobs").exists():
+        for blob in (root / "blobs").glob("*/*"):
+            if blob.stat().st_nlink <= 1:
+                blob.unlink(missing_ok=True)
+    return removed
+
+class AlertIndex:
+    """Какие алерты уже отправлены: один JSON {"город|дата|час": время} вместо файла-маркера на каждый"""
+
+    def __init__(self, path=ART / "alerts.json", keep_days=3):
+        self.path = Path(path)
+        self.keep = keep_days * 86400
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+        self._import_markers()
+
+    def _import_markers(self):
+        """Маркеры last_alert_<город>_<дата>_<час>.txt (до alerts.json) — в индекс, затем удаляются"""
+        markers = list(self.path.parent.glob("last_alert_*.txt"))
+        if not markers:
+            return
+        for p in markers:
+            parts = p.stem[len("last_alert_"):].rsplit("_", 2)
+            if len(parts) == 3 and parts[2].isdigit():
+                try:
+                    ts = p.stat().st_mtime
+                except OSError:
+                    continue
+                key = self.key(parts[0], parts[1], int(parts[2]))
+                self.data[key] = max(ts, self.data.get(key, 0))
+        try:
+            self._save()
+        except OSError as e:
+            print(f"WARN: cannot import alert markers: {e}")
+            return
+        for p in markers:
+            p.unlink(missing_ok=True)
+        print(f"Imported {len(markers)} legacy alert markers into {self.path.name}")
+
+    @staticmethod
+    def key(city_key, date_text, hour):
+        return f"{city_key}|{date_text}|{hour}"
+
+    def sent(self, city_key, date_text, hour):
+        return self.key(city_key, date_text, hour) in self.data
+
+    def mark(self, city_key, date_text, hour):
+        now = time.time()
+        self.data = {k: ts for k, ts in self.data.items() if now - ts < self.keep}
+        self.data[self.key(city_key, date_text, hour)] = now
+        self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".alerts_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+_alerts = None
+
+def alerts():
+    global _alerts
+    if _alerts is None:
+        _alerts = AlertIndex()
+    return _alerts
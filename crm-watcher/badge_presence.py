@@ -1,18 +1,50 @@
-import cv2, numpy as np, re, argparse, datetime as dt
-import easyocr
+import os, cv2, re, argparse, json, datetime as dt
 
 from zoneinfo import ZoneInfo
 
+from color_planes import ColorPlanes
+
 # Lazy initialization of OCR reader
 _reader = None
+# easyocr — как раньше; onnx — модели EasyOCR через onnxruntime (onnx_ocr.py), без PyTorch;
+# digits — шаблонный распознаватель цифр (digit_reader.py), общий OCR только при сомнениях;
+# digits+onnx — то же, но общий OCR — ONNX
+OCR_BACKEND = os.getenv("CRM_OCR_BACKEND", "easyocr")
+
+def _local_reader():
+    import easyocr
+    return easyocr.Reader(["ru","en"], gpu=False, verbose=False)
 
 def get_reader():
-    """Lazy initialization of EasyOCR reader to avoid downloading models on import"""
+    """
+    Lazy initialization of OCR reader: the warm ocr_worker.py process if its socket is up,
+    otherwise EasyOCR in this process (models are not loaded on import).
+    CRM_OCR_BACKEND=onnx swaps it for onnx_ocr.OnnxReader, digits puts the template digit reader in front
+    """
     global _reader
     if _reader is None:
-        _reader = easyocr.Reader(["ru","en"], gpu=False, verbose=False)
+        backends = OCR_BACKEND.split("+")
+        general = _onnx_reader if backends[-1] == "onnx" else _easyocr_reader
+        if backends[0] == "digits":
+            from digit_reader import DigitReader
+            _reader = DigitReader(fallback=general)
+        else:
+            _reader = general()
     return _reader
 
+def _onnx_reader():
+    from onnx_ocr import OnnxReader, models_available, MODELS_DIR
+    if not models_available():
+        print(f"WARN: no ONNX OCR models in {MODELS_DIR} (python onnx_ocr.py --export) — using EasyOCR")
+        return _easyocr_reader()
+    return OnnxReader()
+
+def _easyocr_reader():
+    from ocr_worker import RemoteReader, worker_available
+    if worker_available():
+        return RemoteReader(fallback=_local_reader)
+    return _local_reader()
+
 def target_date_str(which, timezone="Europe/Warsaw"):
     """Возвращает строку даты в формате DD.MM для указанного часового пояса"""
     now = dt.datetime.now(ZoneInfo(timezone))
@@ -34,7 +66,96 @@ def find_date_bbox(img_bgr, date_text):
             best=_bbox_from_quad(box); best_conf=conf
     return best
 
-def detect_red_badge_near_date(img_bgr, date_bbox, debug=False):
+# Дата внутри токена OCR: "3.11", "3.11 Пн", "4.11," — как раньше `wanted in text`, но без цифр по краям
+DATE_LABEL_RE = re.compile(r"(?<!\d)(\d{1,2})[.,](\d{2})(?!\d)")
+
+# Геометрия карточки даты (та же, что в detect_red_badge_near_date)
+CARD_WIDTH = 250
+
+def date_labels(box, text):
+    """[("D.MM", bbox)] для всех дат в токене OCR; bbox сужается по позиции даты в строке"""
+    text = re.sub(r"\s+", "", str(text))
+    x, y, w, h = _bbox_from_quad(box)
+    out = []
+    for m in DATE_LABEL_RE.finditer(text):
+        day, month = int(m.group(1)), int(m.group(2))
+        if not (1 <= day <= 31 and 1 <= month <= 12):
+            continue
+        if len(text) > len(m.group(0)):
+            x1 = x + int(w * m.start() / len(text))
+            x2 = x + int(round(w * m.end() / len(text)))
+            bbox = (x1, y, max(1, x2 - x1), h)
+        else:
+            bbox = (x, y, w, h)
+        out.append((f"{day}.{m.group(2)}", bbox))
+    return out
+
+def find_all_date_bboxes(img_bgr):
+    """Все видимые даты "D.MM" -> bbox за ОДИН проход OCR"""
+    dates = {}
+    for box, text, conf in get_reader().readtext(img_bgr, detail=1, paragraph=False):
+        for key, bbox in date_labels(box, text):
+            if key not in dates or conf > dates[key][1]:
+                dates[key] = (bbox, conf)
+    return {k: v[0] for k, v in dates.items()}
+
+def find_all_red_badges(img_bgr, planes=None):
+    """Все красные badge кадра: одна красная маска (из ColorPlanes) + один findContours"""
+    planes = planes or ColorPlanes(img_bgr)
+    contours, _ = cv2.findContours(planes.red, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    badges = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < 300 or area > 3000:
+            continue
+        bx, by, bw, bh = cv2.boundingRect(contour)
+        aspect_ratio = bw / float(bh) if bh > 0 else 0
+        if 0.7 <= aspect_ratio <= 1.5:
+            badges.append((bx, by, bw, bh))
+    return badges
+
+def _badge_for_date(date_bbox, badges):
+    """Badge в правом верхнем углу карточки даты (та же область, что в detect_red_badge_near_date)"""
+    x, y, w, h = date_bbox
+    x1, x2 = x + CARD_WIDTH - 80, x + CARD_WIDTH + 20
+    y1, y2 = y - 10, y + 60
+    for bx, by, bw, bh in badges:
+        if x1 <= bx and bx + bw <= x2 and y1 <= by and by + bh <= y2:
+            return (bx, by, bw, bh)
+    return None
+
+def read_badge_numbers(img_bgr, badge_boxes, pad=3, planes=None):
+    """Цифры во всех badge одним пакетным вызовом распознавания (без детектора текста)"""
+    if not badge_boxes:
+        return []
+    H, W = img_bgr.shape[:2]
+    gray = (planes or ColorPlanes(img_bgr)).gray
+    boxes = [[max(0, x-pad), min(W, x+w+pad), max(0, y-pad), min(H, y+h+pad)] for x, y, w, h in badge_boxes]
+    res = get_reader().recognize(gray, horizontal_list=boxes, free_list=[], detail=1, batch_size=len(boxes),
+                                 allowlist="0123456789", paragraph=False)
+    numbers = []
+    for _, text, _ in res:
+        m = re.search(r"\d{1,3}", str(text))
+        numbers.append(int(m.group(0)) if m else None)
+    return numbers
+
+def date_badge_counts(img_bgr, dates=None, planes=None):
+    """
+    Один проход по скриншоту: "D.MM" -> {date_box, badge_box, count}.
+    count — число в badge (0 если badge нет, None если badge есть, но цифры не прочитались).
+    """
+    if dates is None:
+        dates = find_all_date_bboxes(img_bgr)
+    planes = planes or ColorPlanes(img_bgr)
+    badges = find_all_red_badges(img_bgr, planes)
+    cells = {key: {"date_box": box, "badge_box": _badge_for_date(box, badges), "count": 0}
+             for key, box in dates.items()}
+    with_badge = [key for key, c in cells.items() if c["badge_box"]]
+    for key, num in zip(with_badge, read_badge_numbers(img_bgr, [cells[k]["badge_box"] for k in with_badge], planes=planes)):
+        cells[key]["count"] = num
+    return cells
+
+def detect_red_badge_near_date(img_bgr, date_bbox, debug=False, planes=None):
     """
     Ищем КРАСНЫЙ BADGE С ЦИФРОЙ рядом с датой.
     Это количество неразобранных заказов для КОНКРЕТНОЙ даты.
@@ -54,13 +175,9 @@ def detect_red_badge_near_date(img_bgr, date_bbox, debug=False):
     search_x2 = min(W, x + card_width + 20)  # Немного за край
     search_y2 = min(H, y + 60)  # Вниз от даты
     
-    roi = img_bgr[search_y1:search_y2, search_x1:search_x2]
-    
-    # Ищем красный цвет (badge)
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    m1 = cv2.inRange(hsv, np.array([0, 150, 150]), np.array([10, 255, 255]))
-    m2 = cv2.inRange(hsv, np.array([170, 150, 150]), np.array([180, 255, 255]))
-    red_mask = m1 | m2
+    # Ищем красный цвет (badge) — срез маски, посчитанной один раз на кадр
+    planes = planes or ColorPlanes(img_bgr)
+    red_mask = planes.roi(search_x1, search_y1, search_x2 - search_x1, search_y2 - search_y1).red
     
     # Находим контуры красных областей
     contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -101,12 +218,12 @@ def detect_red_badge_near_date(img_bgr, date_bbox, debug=False):
     
     return False, None, None, 0.0
 
-def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
+def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False, planes=None):
     """
     Проверяет наличие КРАСНОГО BADGE рядом с датой.
     Badge показывает количество неразобранных заказов для КОНКРЕТНОЙ даты.
     """
-    badge_found, badge_bbox, dbg_img, _ = detect_red_badge_near_date(img_bgr, date_bbox, debug)
+    badge_found, badge_bbox, dbg_img, _ = detect_red_badge_near_date(img_bgr, date_bbox, debug, planes)
     
     if badge_found:
         print(f"    🔴 НАЙДЕН КРАСНЫЙ BADGE рядом с датой - есть неразобранные заказы!")
@@ -116,27 +233,30 @@ def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
     return badge_found, badge_bbox, dbg_img, 0.0
 
 # Обратная совместимость
-def detect_badge_presence(img_bgr, date_bbox, debug=False):
-    return detect_badge_presence_ocr(img_bgr, date_bbox, debug)
+def detect_badge_presence(img_bgr, date_bbox, debug=False, planes=None):
+    return detect_badge_presence_ocr(img_bgr, date_bbox, debug, planes)
 
-def red_mask_union(img_bgr):
-    """Создает маску красных пикселей для отладки"""
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-    m1 = cv2.inRange(hsv, np.array([0, 80, 80]), np.array([15, 255, 255]))
-    m2 = cv2.inRange(hsv, np.array([165, 80, 80]), np.array([180, 255, 255]))
-    return m1 | m2
+def red_mask_union(img_bgr, planes=None):
+    """Создает маску красных пикселей для отладки (planes — уже посчитанные плоскости этой ROI)"""
+    return (planes or ColorPlanes(img_bgr)).red_soft
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--image", default="debug/03_after_submit.png")
     ap.add_argument("--target", default="tomorrow", choices=["today","tomorrow"])
     ap.add_argument("--out", default="debug/presence_debug.png")
+    ap.add_argument("--all", action="store_true", help="вывести JSON: все даты -> число неразобранных")
     args = ap.parse_args()
 
     img = cv2.imread(args.image)
     if img is None:
         raise SystemExit(f"no image at {args.image}")
 
+    if args.all:
+        cells = date_badge_counts(img)
+        print(json.dumps({k: c["count"] for k, c in cells.items()}, ensure_ascii=False))
+        return
+
     date_txt = target_date_str(args.target)
     date_box = find_date_bbox(img, date_txt)
     present, roi, dbg, _ = detect_badge_presence_ocr(img, date_box, debug=True)
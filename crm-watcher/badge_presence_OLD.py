@@ -1,7 +1,6 @@
 import cv2, numpy as np, re, argparse, datetime as dt
-import easyocr
-
-reader = easyocr.Reader(["ru","en"], gpu=False, verbose=False)
+from badge_presence import get_reader
+from color_planes import ColorPlanes
 
 from zoneinfo import ZoneInfo
 
@@ -17,7 +16,7 @@ def _bbox_from_quad(quad):
     return int(x1),int(y1),int(x2-x1),int(y2-y1)
 
 def find_date_bbox(img_bgr, date_text):
-    res = reader.readtext(img_bgr, detail=1, paragraph=False)
+    res = get_reader().readtext(img_bgr, detail=1, paragraph=False)
     wanted = re.sub(r"\s+","", date_text)
     best=None; best_conf=0.0
     for box,text,conf in res:
@@ -25,32 +24,31 @@ def find_date_bbox(img_bgr, date_text):
             best=_bbox_from_quad(box); best_conf=conf
     return best
 
-def red_mask_union(img_bgr):
-    H,W = img_bgr.shape[:2]
+def _rgb_red(planes):
+    # RGB критерий - красный должен быть больше синего и зеленого
+    bgr = planes.bgr.astype(np.int16)
+    b, g, r = bgr[:,:,0], bgr[:,:,1], bgr[:,:,2]
+    return ((r-g > 12) & (r-b > 12) & (r > 90)).astype(np.uint8)*255
+
+def red_mask_union(img_bgr, planes=None):
+    planes = planes or ColorPlanes(img_bgr)
     # HSV маска (широкая)
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-    m1 = cv2.inRange(hsv, np.array([  0, 15, 50]), np.array([28,255,255]))
-    m2 = cv2.inRange(hsv, np.array([160, 15, 50]), np.array([179,255,255]))
+    m12 = planes.red_broad
     
     # ИСКЛЮЧАЕМ синие оттенки (значок скидки)
     # Синий в HSV: примерно 90-130 градусов
-    blue_mask = cv2.inRange(hsv, np.array([90, 40, 40]), np.array([130, 255, 255]))
+    blue_mask = planes.blue
     
-    # RGB критерий - красный должен быть больше синего и зеленого
-    b,g,r = cv2.split(img_bgr)
-    rgb = ((r.astype(np.int16)-g.astype(np.int16) > 12) &
-           (r.astype(np.int16)-b.astype(np.int16) > 12) &
-           (r > 90)).astype(np.uint8)*255
+    rgb = planes.derived("rgb_red", _rgb_red)
     
     # LAB: красное = высокий a*
-    lab = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2LAB)
-    L,A,B = cv2.split(lab)
+    A = planes.lab[:,:,1]
     # адаптивный порог по a*: базовый 145, либо (mean+0.8*std), что больше
     thr = max(145, int(np.mean(A) + 0.8*np.std(A)))
     lab_mask = (A >= thr).astype(np.uint8)*255
 
     # Объединяем красные маски
-    mask = m1 | m2 | rgb | lab_mask
+    mask = m12 | rgb | lab_mask
     
     # ИСКЛЮЧАЕМ синий цвет из финальной маски
     mask = cv2.bitwise_and(mask, cv2.bitwise_not(blue_mask))
@@ -60,7 +58,7 @@ def red_mask_union(img_bgr):
     mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,  cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(7,7)), iterations=1)
     return mask
 
-def detect_badge_presence(img_bgr, date_bbox, debug=False):
+def detect_badge_presence(img_bgr, date_bbox, debug=False, planes=None):
     if not date_bbox:
         return False, None, None, 0.0
     H,W = img_bgr.shape[:2]
@@ -74,7 +72,7 @@ def detect_badge_presence(img_bgr, date_bbox, debug=False):
     x2 = min(W, int(x + w + w*5))  # до 5x ширины даты справа (компромисс)
 
     roi = img_bgr[y1:y2, x1:x2]
-    mask = red_mask_union(roi)
+    mask = red_mask_union(roi, (planes or ColorPlanes(img_bgr)).roi(x1, y1, x2-x1, y2-y1))
 
     # доля красного в полосе (для отладки)
     red_ratio = float((mask>0).sum()) / max(1, mask.size)
@@ -153,11 +151,12 @@ def main():
 
     date_txt = target_date_str(args.target)
     date_box = find_date_bbox(img, date_txt)
-    present, roi, dbg, red_ratio = detect_badge_presence(img, date_box, debug=True)
+    planes = ColorPlanes(img)
+    present, roi, dbg, red_ratio = detect_badge_presence(img, date_box, debug=True, planes=planes)
 
     if roi:
         rx,ry,rw,rh = roi
-        cv2.imwrite(args.mask, red_mask_union(img[ry:ry+rh, rx:rx+rw]))
+        cv2.imwrite(args.mask, red_mask_union(img[ry:ry+rh, rx:rx+rw], planes.roi(rx, ry, rw, rh)))
     if dbg is not None:
         cv2.imwrite(args.out, dbg)
 
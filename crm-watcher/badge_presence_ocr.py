@@ -1,7 +1,6 @@
 import cv2, numpy as np, re, argparse, datetime as dt
-import easyocr
-
-reader = easyocr.Reader(["ru","en"], gpu=False, verbose=False)
+from badge_presence import get_reader
+from color_planes import ColorPlanes
 
 from zoneinfo import ZoneInfo
 
@@ -18,7 +17,7 @@ def _bbox_from_quad(quad):
     return int(x1),int(y1),int(x2-x1),int(y2-y1)
 
 def find_date_bbox(img_bgr, date_text):
-    res = reader.readtext(img_bgr, detail=1, paragraph=False)
+    res = get_reader().readtext(img_bgr, detail=1, paragraph=False)
     wanted = re.sub(r"\s+","", date_text)
     best=None; best_conf=0.0
     for box,text,conf in res:
@@ -26,7 +25,7 @@ def find_date_bbox(img_bgr, date_text):
             best=_bbox_from_quad(box); best_conf=conf
     return best
 
-def is_badge(img_bgr, text_bbox):
+def is_badge(img_bgr, text_bbox, planes=None):
     """Проверяет, является ли это badge (красный круглый фон с белым текстом)"""
     x, y, w, h = text_bbox
     
@@ -37,24 +36,17 @@ def is_badge(img_bgr, text_bbox):
     x2 = min(img_bgr.shape[1], x + w + padding)
     y2 = min(img_bgr.shape[0], y + h + padding)
     
-    roi = img_bgr[y1:y2, x1:x2]
-    
-    if roi.size == 0:
+    if x2 <= x1 or y2 <= y1:
         return False
     
-    # HSV маска для НАСЫЩЕННОГО красного (badge)
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    # Более строгие параметры для badge - яркий насыщенный красный
-    m1 = cv2.inRange(hsv, np.array([0, 120, 120]), np.array([10, 255, 255]))
-    m2 = cv2.inRange(hsv, np.array([170, 120, 120]), np.array([180, 255, 255]))
-    red_mask = m1 | m2
-    
+    sub = (planes or ColorPlanes(img_bgr)).roi(x1, y1, x2 - x1, y2 - y1)
+    # HSV маска для НАСЫЩЕННОГО красного (badge) - яркий насыщенный красный
+    red_mask = sub.red_mid
     # Маска для белого текста внутри badge
-    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    _, white_mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
+    white_mask = sub.bright
     
     # Процент красного и белого
-    total_pixels = roi.shape[0] * roi.shape[1]
+    total_pixels = red_mask.shape[0] * red_mask.shape[1]
     red_ratio = np.sum(red_mask > 0) / total_pixels
     white_ratio = np.sum(white_mask > 0) / total_pixels
     
@@ -68,13 +60,14 @@ def is_badge(img_bgr, text_bbox):
     
     return is_badge
 
-def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
+def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False, planes=None):
     """
     Новый подход: ищем ЦИФРЫ в красном тексте рядом с датой
     Badge всегда содержит число (количество заказов)
     """
     if not date_bbox:
         return False, None, None, 0.0
+    planes = planes or ColorPlanes(img_bgr)
     
     H, W = img_bgr.shape[:2]
     x, y, w, h = date_bbox
@@ -89,7 +82,7 @@ def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
     
     # OCR в области справа от даты
     try:
-        ocr_results = reader.readtext(roi, detail=1, paragraph=False)
+        ocr_results = get_reader().readtext(roi, detail=1, paragraph=False)
     except:
         return False, (x1, y1, x2-x1, y2-y1), None, 0.0
     
@@ -114,7 +107,7 @@ def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
         )
         
         # Проверяем что это BADGE (красный фон + белая цифра)
-        if not is_badge(img_bgr, abs_text_bbox):
+        if not is_badge(img_bgr, abs_text_bbox, planes):
             continue
         
         # Это badge! Цифра на красном фоне
@@ -143,8 +136,8 @@ def detect_badge_presence_ocr(img_bgr, date_bbox, debug=False):
     return badge_found, (x1, y1, x2-x1, y2-y1), None, 0.0
 
 # Обратная совместимость - старое название функции
-def detect_badge_presence(img_bgr, date_bbox, debug=False):
-    return detect_badge_presence_ocr(img_bgr, date_bbox, debug)
+def detect_badge_presence(img_bgr, date_bbox, debug=False, planes=None):
+    return detect_badge_presence_ocr(img_bgr, date_bbox, debug, planes)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Офлайн бенчмарк детекторов на сохранённых скриншотах дашборда.
+
+Корпус — папка с PNG и labels.json (разметка):
+    [
+      {"image": "dash_warsaw_20251025_204000.png", "date": "26.10", "present": false},
+      {"image": "dash_berlin_20251122_190000.png", "date": "23.11", "present": true}
+    ]
+Картинки без разметки (или без labels.json вообще) учитываются только в таймингах.
+
+Запуск:
+    python benchmark.py --corpus run_artifacts --out bench_result.json
+    python benchmark.py --corpus run_artifacts --compare bench_prev.json
+    python benchmark.py --detectors badge_presence --ocr-backends easyocr,onnx,digits+onnx
+
+Каждый детектор гоняется в отдельном процессе, чтобы peak RSS был честным (модель грузится заново).
+С --ocr-backends каждый детектор гоняется на каждом OCR бэкенде (CRM_OCR_BACKEND), стадия ocr_init — холодный старт.
+"""
+
+import os, sys, json, time, argparse, platform, resource, subprocess, datetime as dt
+import multiprocessing
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+DETECTORS = ("badge_presence", "badge_presence_ocr", "date_badge_ocr", "badge_presence_OLD")
+
+def load_corpus(corpus):
+    corpus = Path(corpus)
+    labels_path = corpus / "labels.json"
+    items = []
+    if labels_path.exists():
+        for row in json.loads(labels_path.read_text(encoding="utf-8")):
+            items.append({"image": str(corpus / row["image"]), "date": row["date"], "present": row.get("present")})
+    labelled = {i["image"] for i in items}
+    for p in sorted(corpus.glob("*.png")):
+        # отладочные картинки самого монитора — не скриншоты
+        if str(p) in labelled or p.stem.endswith(("_mask", "_dbg", "_resized")):
+            continue
+        items.append({"image": str(p), "date": None, "present": None})
+    return items
+
+def _stages(name):
+    """(find_date, detect) для детектора; импорт модуля — внутри процесса-воркера"""
+    if name == "date_badge_ocr":
+        import date_badge_ocr as m
+        from color_planes import ColorPlanes
+        def detect(img, box):
+            planes = ColorPlanes(img)
+            boxes, _ = m.find_red_components(img, planes)
+            chosen, _ = m.choose_badge_right_of_date(img, box, boxes, planes)
+            return bool(chosen)
+        return m.find_date_bbox, detect
+    mod = __import__(name)
+    return mod.find_date_bbox, lambda img, box: bool(mod.detect_badge_presence(img, box, debug=False)[0])
+
+def _run_detector(name, items, queue):
+    """Обёртка для дочернего процесса: ошибка (нет easyocr, не грузятся модели) уходит в очередь, а не теряется"""
+    try:
+        _bench_detector(name, items, queue)
+    except BaseException as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+
+def _bench_detector(name, items, queue):
+    import cv2
+    timings = {"load": [], "ocr_init": [], "decode": [], "find_date": [], "detect": [], "total": []}
+    t0 = time.perf_counter()
+    find_date, detect = _stages(name)
+    timings["load"].append(time.perf_counter() - t0)   # импорт модуля
+    from badge_presence import get_reader
+    t0 = time.perf_counter()
+    get_reader()
+    timings["ocr_init"].append(time.perf_counter() - t0)   # импорт OCR и загрузка модели
+    rows = []
+    for item in items:
+        t_start = time.perf_counter()
+        img = cv2.imread(item["image"])
+        t_dec = time.perf_counter()
+        if img is None:
+            rows.append({"image": item["image"], "error": "unreadable"})
+            continue
+        date = item["date"] or _guess_date(item["image"])
+        box = find_date(img, date) if date else None
+        t_find = time.perf_counter()
+        present = detect(img, box) if box else False
+        t_det = time.perf_counter()
+        timings["decode"].append(t_dec - t_start)
+        timings["find_date"].append(t_find - t_dec)
+        timings["detect"].append(t_det - t_find)
+        timings["total"].append(t_det - t_start)
+        rows.append({"image": item["image"], "date": date, "date_found": bool(box),
+                     "predicted": present, "expected": item["present"]})
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024  # macOS — байты, Linux — КБ
+    queue.put({"rows": rows, "timings": timings, "peak_rss_mb": round(rss_mb, 1)})
+
+def _wait_result(proc, queue, poll=1.0):
+    """Результат из очереди; если процесс умер, ничего не положив (segfault, OOM-killer) — ошибка, а не зависание"""
+    import queue as queue_mod
+    while True:
+        try:
+            return queue.get(timeout=poll)
+        except queue_mod.Empty:
+            if not proc.is_alive():
+                try:
+                    return queue.get(timeout=poll)
+                except queue_mod.Empty:
+                    return {"error": f"detector process exited with code {proc.exitcode} without a result"}
+
+def _guess_date(image):
+    """Для неразмеченных скриншотов dash_<city>_YYYYMMDD_HHMMSS.png: дата по правилу монитора (до 12 — сегодня)"""
+    parts = Path(image).stem.split("_")
+    try:
+        ts = dt.datetime.strptime("_".join(parts[-2:]), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
+    d = ts.date() + dt.timedelta(days=0 if ts.hour < 12 else 1)
+    return f"{d.day}.{d.month:02d}"
+
+def percentiles(values):
+    if not values:
+        return None
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+    return {"n": len(v), "p50_ms": round(pick(0.5) * 1000, 2), "p90_ms": round(pick(0.9) * 1000, 2),
+            "p99_ms": round(pick(0.99) * 1000, 2), "max_ms": round(v[-1] * 1000, 2)}
+
+def accuracy(rows):
+    labelled = [r for r in rows if r.get("expected") is not None and "error" not in r]
+    tp = sum(1 for r in labelled if r["predicted"] and r["expected"])
+    fp = sum(1 for r in labelled if r["predicted"] and not r["expected"])
+    fn = sum(1 for r in labelled if not r["predicted"] and r["expected"])
+    tn = sum(1 for r in labelled if not r["predicted"] and not r["expected"])
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    return {"labelled": len(labelled), "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+            "precision": precision, "recall": recall,
+            "false_positives": [r["image"] for r in labelled if r["predicted"] and not r["expected"]],
+            "dates_not_found": sum(1 for r in rows if r.get("date") and not r.get("date_found"))}
+
+def run(corpus, detectors, backends=None):
+    items = load_corpus(corpus)
+    print(f"📚 Corpus: {len(items)} images ({sum(1 for i in items if i['present'] is not None)} labelled)")
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for backend in backends or [None]:
+        if backend:
+            os.environ["CRM_OCR_BACKEND"] = backend   # spawn: дочерний процесс читает окружение при импорте
+        for name in detectors:
+            key = f"{name}@{backend}" if backend else name
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_detector, args=(name, items, queue))
+            proc.start()
+            res = _wait_result(proc, queue)
+            proc.join()
+            if "error" in res:
+                print(f"  {key:32s} FAILED: {res['error']}")
+                results[key] = {"error": res["error"]}
+                continue
+            stages = {stage: percentiles(vals) for stage, vals in res["timings"].items()}
+            results[key] = {"stages": stages, "peak_rss_mb": res["peak_rss_mb"],
+                            "accuracy": accuracy(res["rows"]), "rows": res["rows"]}
+            acc = results[key]["accuracy"]
+            print(f"  {key:32s} total p50={stages['total'] and stages['total']['p50_ms']}ms "
+                  f"ocr_init={stages['ocr_init'] and stages['ocr_init']['max_ms']}ms rss={res['peak_rss_mb']}MB "
+                  f"precision={acc['precision']} recall={acc['recall']} fp={acc['fp']}")
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def compare(current, previous):
+    print("\n📈 Сравнение с предыдущим результатом:")
+    for name, res in current["detectors"].items():
+        old = previous.get("detectors", {}).get(name)
+        if not old or "error" in old or "error" in res:
+            continue
+        for stage in ("ocr_init", "find_date", "detect", "total"):
+            a, b = (old["stages"].get(stage) or {}), (res["stages"].get(stage) or {})
+            if a.get("p50_ms") and b.get("p50_ms"):
+                print(f"  {name:20s} {stage:10s} p50 {a['p50_ms']} -> {b['p50_ms']} ms ({b['p50_ms']/a['p50_ms']:.2f}x)")
+        print(f"  {name:20s} rss {old['peak_rss_mb']} -> {res['peak_rss_mb']} MB, "
+              f"fp {old['accuracy']['fp']} -> {res['accuracy']['fp']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=str(ROOT / "run_artifacts"))
+    ap.add_argument("--detectors", default=",".join(DETECTORS))
+    ap.add_argument("--out", default="bench_result.json")
+    ap.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    ap.add_argument("--ocr-backends", help="через запятую: easyocr,onnx,digits,digits+onnx (по умолчанию — CRM_OCR_BACKEND)")
+    args = ap.parse_args()
+
+    detectors = [d for d in args.detectors.split(",") if d]
+    unknown = set(detectors) - set(DETECTORS)
+    if unknown:
+        raise SystemExit(f"unknown detectors: {', '.join(sorted(unknown))}")
+
+    result = {
+        "commit": _git_commit(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus": os.path.abspath(args.corpus),
+        "ocr_backend": args.ocr_backends or os.getenv("CRM_OCR_BACKEND", "easyocr"),
+        "detectors": run(args.corpus, detectors, [b for b in (args.ocr_backends or "").split(",") if b]),
+    }
+    Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Saved: {args.out}")
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    if any("error" in r for r in result["detectors"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Общий пул браузера: один Chromium на процесс, изолированный контекст на город
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+LAUNCH_ARGS = ["--no-sandbox", "--disable-dev-shm-usage"]
+
+class BrowserPool:
+    """Держит один запущенный Chromium и выдаёт контексты с ограничением параллелизма"""
+
+    def __init__(self, max_contexts=2, headless=True):
+        self.max_contexts = max(1, int(max_contexts))
+        self.headless = headless
+        self._sem = asyncio.Semaphore(self.max_contexts)
+        self._lock = asyncio.Lock()
+        self._pw = None
+        self._browser = None
+        self.launches = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        """Запускает браузер (один раз на процесс; повторно — только если он упал)"""
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._pw is None:
+                self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+            self.launches += 1
+            print(f"🌐 Chromium запущен (запуск #{self.launches}, контекстов одновременно: {self.max_contexts})")
+            return self._browser
+
+    async def close(self):
+        async with self._lock:
+            if self._browser is not None:
+                try:
+                    await self._browser.close()
+                except Exception as e:
+                    print(f"WARN: browser close failed: {e}")
+                self._browser = None
+            if self._pw is not None:
+                await self._pw.stop()
+                self._pw = None
+
+    @asynccontextmanager
+    async def context(self, **ctx_kwargs):
+        """Изолированный контекст (куки, storage) для одного города/попытки"""
+        async with self._sem:
+            browser = await self.start()
+            ctx = await browser.new_context(**ctx_kwargs)
+            try:
+                yield ctx
+            finally:
+                try:
+                    await ctx.close()
+                except Exception as e:
+                    print(f"WARN: context close failed: {e}")
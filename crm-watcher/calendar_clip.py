@@ -0,0 +1,158 @@
+"""
+Область скриншота дашборда: только календарь (или только карточка целевой даты) вместо фиксированного
+прямоугольника 1440×450 — меньше пикселей на PNG, декодирование, OCR, и чистая картинка в Telegram.
+
+Рамка берётся по порядку: "calendar_selector" из конфига города -> карточки дат из DOM ->
+рамка из кеша города (cache/calendar_clip.json) -> карточки дат, найденные отдельным запросом к DOM ->
+прежний прямоугольник. Рамка — в координатах страницы (страница прокручена в начало); из карточек
+берётся только верхний блок календаря, слишком высокая рамка отбрасывается.
+"""
+
+import os, json
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+CACHE_PATH = ROOT / "cache" / "calendar_clip.json"
+
+# calendar — весь календарь; card — только карточка целевой даты; fixed — прежний прямоугольник
+CLIP_MODE = os.getenv("CRM_CLIP", "calendar")
+FIXED_CLIP = (0, 0, 1440, 450)
+# Поля вокруг карточек, px (тени, обводка badge)
+PAD = int(os.getenv("CRM_CLIP_PAD", "12"))
+# Рамка выше этого — значит, в неё попали не только карточки; 0 — без ограничения
+MAX_HEIGHT = int(os.getenv("CRM_CLIP_MAX_HEIGHT", "900"))
+
+def union(boxes, pad=PAD):
+    """(x, y, w, h), охватывающий все рамки, с полями; None, если рамок нет"""
+    boxes = [b for b in boxes if b and b[2] > 0 and b[3] > 0]
+    if not boxes:
+        return None
+    x1 = max(0, min(b[0] for b in boxes) - pad)
+    y1 = max(0, min(b[1] for b in boxes) - pad)
+    x2 = max(b[0] + b[2] for b in boxes) + pad
+    y2 = max(b[1] + b[3] for b in boxes) + pad
+    return (x1, y1, x2 - x1, y2 - y1)
+
+def _cell_box(c):
+    return union([c.get("card_box"), c.get("date_box"), c.get("badge_box")], pad=0)
+
+def calendar_cells(cells):
+    """
+    Карточки календаря — сплошной блок сверху: от верхней карточки вниз, пока разрыв между
+    рядами не больше высоты карточки. Даты "D.MM" ниже (Статистика, Новые заказы) отбрасываются.
+    """
+    boxed = sorted(((b, k) for k, b in ((k, _cell_box(c)) for k, c in cells.items()) if b),
+                   key=lambda t: t[0][1])
+    if not boxed:
+        return {}
+    heights = sorted(b[3] for b, _ in boxed)
+    gap = heights[len(heights) // 2]
+    bottom = boxed[0][0][1] + boxed[0][0][3]
+    keep = []
+    for b, k in boxed:
+        if b[1] > bottom + gap:
+            break
+        keep.append(k)
+        bottom = max(bottom, b[1] + b[3])
+    return {k: cells[k] for k in keep}
+
+def clip_from_cells(cells, date_text=None, mode=CLIP_MODE):
+    """
+    Рамка по карточкам дат из read_date_cells: блока календаря (плюс целевая дата), или только
+    date_text в режиме card. None, если рамка выше MAX_HEIGHT — тогда берётся кеш/FIXED_CLIP.
+    """
+    if not cells:
+        return None
+    if mode == "card" and date_text in cells:
+        cells = {date_text: cells[date_text]}
+    else:
+        target = cells.get(date_text)
+        cells = calendar_cells(cells)
+        if target:
+            cells[date_text] = target
+    clip = union([_cell_box(c) for c in cells.values()])
+    if clip and MAX_HEIGHT and clip[3] > MAX_HEIGHT:
+        print(f"WARN: calendar clip {clip} taller than {MAX_HEIGHT}px — ignored")
+        return None
+    return clip
+
+def shift_cells(cells, dx, dy):
+    """Рамки ячеек DOM в координатах скриншота, снятого с clip (x, y) = (-dx, -dy)"""
+    move = lambda b: (b[0] + dx, b[1] + dy, b[2], b[3]) if b else None
+    return {k: dict(c, date_box=move(c["date_box"]), card_box=move(c.get("card_box")),
+                    badge_box=move(c.get("badge_box"))) for k, c in cells.items()}
+
+class ClipCache:
+    """Последняя рамка календаря по городу: {city_key: [x, y, w, h]}"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = Path(path)
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+
+    def get(self, key):
+        clip = self.data.get(key)
+        return tuple(clip) if clip else None
+
+    def put(self, key, clip):
+        if self.get(key) == (tuple(clip) if clip else None):
+            return
+        if clip:
+            self.data[key] = list(clip)
+        else:
+            self.data.pop(key, None)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"WARN: cannot save calendar clip: {e}")
+
+    def invalidate(self, key):
+        self.put(key, None)
+
+async def find_clip(page, key, config, dom_cells=None, date_text=None, cache=None):
+    """
+    ((x, y, w, h), источник) для page.screenshot(clip=...).
+    key — ключ кеша (город); date_text нужен только для режима card.
+    """
+    mode = config.get("clip", CLIP_MODE)
+    if mode == "fixed":
+        return FIXED_CLIP, "fixed"
+    cache = cache or ClipCache()
+    selector = config.get("calendar_selector")
+    if selector:
+        try:
+            box = await page.locator(selector).first.bounding_box(timeout=5000)
+        except Exception:
+            box = None
+        if box:
+            clip = union([(round(box["x"]), round(box["y"]), round(box["width"]), round(box["height"]))])
+            cache.put(key, clip)
+            return clip, "selector"
+        print(f"WARN: calendar_selector {selector!r} not found — using date cards")
+    # Карточка целевой даты каждый день в новом месте — в кеш кладём только рамку календаря
+    remember = mode != "card"
+    clip = clip_from_cells(dom_cells, date_text, mode)
+    if clip:
+        if remember:
+            cache.put(key, clip)
+        return clip, "dom"
+    clip = cache.get(key) if remember else None
+    if clip:
+        return clip, "cache"
+    from dom_badges import read_date_cells
+    clip = clip_from_cells(await read_date_cells(page), date_text, mode)
+    if clip:
+        if remember:
+            cache.put(key, clip)
+        return clip, "dom"
+    return FIXED_CLIP, "fixed"
+
+async def screenshot(page, clip, path=None):
+    """Скриншот области clip; если она ниже окна — с full_page (Playwright обрежет по clip)"""
+    x, y, w, h = clip
+    viewport = page.viewport_size or {"height": 0}
+    return await page.screenshot(path=path, full_page=y + h > viewport["height"], animations="disabled",
+                                 clip={"x": x, "y": y, "width": w, "height": h})
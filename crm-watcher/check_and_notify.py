@@ -1,9 +1,11 @@
 import os, asyncio, json, datetime as dt
 from pathlib import Path
-import cv2, requests
+import cv2
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright
 
+from telegram_client import TelegramSender, TelegramError
+import calendar_clip
 from badge_presence import find_date_bbox, target_date_str, detect_badge_presence, red_mask_union
 
 load_dotenv()
@@ -13,6 +15,7 @@ LOGIN         = os.getenv("CRM_LOGIN")
 PASSWORD      = os.getenv("CRM_PASSWORD")
 TG_TOKEN      = os.getenv("TELEGRAM_BOT_TOKEN")
 TG_CHAT_ID    = os.getenv("TELEGRAM_CHAT_ID")
+CALENDAR_SEL  = os.getenv("CRM_CALENDAR_SELECTOR")
 
 ROOT = Path(__file__).parent
 ART  = ROOT / "run_artifacts"; ART.mkdir(exist_ok=True)
@@ -42,7 +45,10 @@ async def grab_screenshot():
         try:
             await page.goto(CRM_URL, wait_until="domcontentloaded", timeout=30000)
             await ensure_dashboard(page)
-            await page.screenshot(path=str(out_png), full_page=True)
+            # только календарь, а не вся страница (см. calendar_clip.py)
+            await page.evaluate("window.scrollTo(0, 0)")
+            clip, _ = await calendar_clip.find_clip(page, "check_and_notify", {"calendar_selector": CALENDAR_SEL})
+            await calendar_clip.screenshot(page, clip, path=str(out_png))
         finally:
             await ctx.close(); await browser.close()
     return str(out_png)
@@ -62,27 +68,25 @@ def check_badge_presence(png_path):
         cv2.imwrite(png_path.replace(".png","_dbg.png"), dbg)
     return present, date_text, png_path
 
-def send_photo_with_caption(image_path, caption):
+async def send_photo_with_caption(image_path, caption):
     if not (TG_TOKEN and TG_CHAT_ID):
         print("WARN: no TELEGRAM_BOT_TOKEN/CHAT_ID — skip")
         return False
-    with open(image_path, "rb") as f:
-        r = requests.post(
-            f"https://api.telegram.org/bot{TG_TOKEN}/sendPhoto",
-            data={"chat_id": TG_CHAT_ID, "caption": caption},
-            files={"photo": f},
-            timeout=30,
-        )
-    ok = r.ok and r.json().get("ok", False)
-    if not ok: print("Telegram error:", r.text)
-    return ok
+    photo = Path(image_path).read_bytes()
+    async with TelegramSender(TG_TOKEN) as tg:
+        try:
+            await tg.send_photo(TG_CHAT_ID, photo, caption)
+            return True
+        except TelegramError as e:
+            print("Telegram error:", e)
+            return False
 
 async def main():
     png = await grab_screenshot()
     present, date_text, png_path = check_badge_presence(png)
     if present:
         caption = f"⚠️ На {date_text} есть красная отметка (первый квадрат). Проверьте неразобранные заказы."
-        sent = send_photo_with_caption(png_path, caption)
+        sent = await send_photo_with_caption(png_path, caption)
         print("RESULT:", {"present": True, "sent": sent, "date": date_text, "png": png_path})
     else:
         print("RESULT:", {"present": False, "date": date_text, "png": png_path})
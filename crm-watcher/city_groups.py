@@ -0,0 +1,59 @@
+"""
+Группы городов с общим хостом CRM и общим аккаунтом: один логин и одна загрузка дашборда на группу.
+
+- Сессия (storage_state) хранится на группу, а не на город. Проверка сессии и перелогин идут под lock
+  группы: когда сессии нет или она истекла, логинится один город, остальные ждут и берут его сессию.
+- Если у городов группы один и тот же дашборд (и одинаковое смещение часового пояса),
+  страница грузится и снимается один раз, остальные города анализируют тот же кадр/DOM.
+"""
+
+import os, time, asyncio, hashlib
+from urllib.parse import urlparse
+
+# Сколько секунд снимок дашборда годится для других городов группы (в режиме демона слоты разнесены)
+CAPTURE_TTL = float(os.getenv("CRM_GROUP_CAPTURE_TTL", "120"))
+
+def group_key(config):
+    """Хост + логин (хешем, чтобы логин не попадал в имена файлов)"""
+    host = urlparse(config.get("crm_url") or config.get("crm_dashboard") or "").hostname or ""
+    return hashlib.sha1(f"{host}|{config.get('login', '')}".encode()).hexdigest()[:12]
+
+class CityGroup:
+    def __init__(self, key):
+        self.key = key
+        self.lock = asyncio.Lock()     # держит тот, кто проверяет сессию / логинится
+        self._captures = {}            # ключ страницы -> (monotonic, task)
+
+    async def capture(self, page_key, fn):
+        """
+        Результат fn() для page_key — один на группу в пределах CAPTURE_TTL.
+        Возвращает (result, shared); если снимок владельца упал/отменён — снимаем сами.
+        """
+        hit = self._captures.get(page_key)
+        if hit and time.monotonic() - hit[0] < CAPTURE_TTL:
+            task = hit[1]
+            await asyncio.wait({task})
+            if not task.cancelled() and task.exception() is None:
+                return task.result(), True
+        task = asyncio.ensure_future(fn())
+        self._captures[page_key] = (time.monotonic(), task)
+        try:
+            return await task, False
+        except BaseException:
+            if self._captures.get(page_key, (None, None))[1] is task:
+                del self._captures[page_key]
+            raise
+
+def build_groups(configs):
+    """{city_key: CityGroup} — города с одинаковым хостом и логином получают один объект"""
+    groups, by_key = {}, {}
+    for city_key, config in configs:
+        key = group_key(config)
+        groups[city_key] = by_key.setdefault(key, CityGroup(key))
+    sizes = {}
+    for g in groups.values():
+        sizes[g.key] = sizes.get(g.key, 0) + 1
+    shared = sum(n for n in sizes.values() if n > 1)
+    if shared:
+        print(f"🔑 {len(sizes)} групп логина на {len(groups)} городов ({shared} городов делят сессию)")
+    return groups
@@ -0,0 +1,111 @@
+"""
+Цветовые плоскости кадра: HSV/LAB/серый и маски red/white/blue считаются ОДИН раз на весь кадр,
+а для любой ROI отдаются срезами (views) без копирования и повторных cvtColor
+"""
+
+import cv2, numpy as np
+
+# Пороги HSV (OpenCV: H 0..180)
+RED_STRICT = (((0, 150, 150), (10, 255, 255)), ((170, 150, 150), (180, 255, 255)))   # badge (detect_red_badge_near_date)
+RED_MID    = (((0, 120, 120), (10, 255, 255)), ((170, 120, 120), (180, 255, 255)))   # badge_presence_ocr
+RED_SOFT   = (((0, 80, 80),   (15, 255, 255)), ((165, 80, 80),   (180, 255, 255)))   # отладочная маска
+RED_WIDE   = (((0, 40, 70),   (28, 255, 255)), ((160, 40, 70),   (179, 255, 255)))   # вкл. оранжево-красный (date_badge_ocr)
+RED_BROAD  = (((0, 15, 50),   (28, 255, 255)), ((160, 15, 50),   (179, 255, 255)))   # широкая (badge_presence_OLD)
+BLUE       = (((90, 40, 40),  (130, 255, 255)),)
+
+def _in_ranges(hsv, ranges):
+    mask = None
+    for lo, hi in ranges:
+        m = cv2.inRange(hsv, np.array(lo), np.array(hi))
+        mask = m if mask is None else mask | m
+    return mask
+
+class ColorPlanes:
+    """
+    planes = ColorPlanes(img)          — на весь кадр
+    sub = planes.roi(x, y, w, h)       — то же для прямоугольника (срезы, без копий)
+    sub.hsv / sub.lab / sub.gray / sub.red / sub.red_soft / sub.red_wide / sub.white / ...
+    Плоскости считаются лениво, но не более одного раза на кадр.
+    """
+
+    def __init__(self, img_bgr, _parent=None, _rect=None):
+        self.bgr = img_bgr
+        self._parent = _parent
+        self._rect = _rect
+        self._cache = {}
+
+    def roi(self, x, y, w, h):
+        H, W = self.bgr.shape[:2]
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(W, int(x + w)), min(H, int(y + h))
+        root, ox, oy = self, 0, 0
+        if self._parent is not None:
+            root, (ox, oy) = self._parent, self._rect[:2]
+        return ColorPlanes(self.bgr[y1:y2, x1:x2], _parent=root, _rect=(ox + x1, oy + y1, x2 - x1, y2 - y1))
+
+    def _plane(self, name):
+        if self._parent is not None:
+            x, y, w, h = self._rect
+            return self._parent._plane(name)[y:y+h, x:x+w]
+        if name not in self._cache:
+            self._cache[name] = getattr(self, f"_compute_{name}")()
+        return self._cache[name]
+
+    def derived(self, name, fn):
+        """Произвольная производная плоскость fn(planes) всего кадра — считается один раз"""
+        if self._parent is not None:
+            x, y, w, h = self._rect
+            return self._parent.derived(name, fn)[y:y+h, x:x+w]
+        key = f"derived:{name}"
+        if key not in self._cache:
+            self._cache[key] = fn(self)
+        return self._cache[key]
+
+    # --- вычисления на весь кадр ---
+    def _compute_hsv(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+
+    def _compute_lab(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2LAB)
+
+    def _compute_gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    def _compute_red(self):
+        return _in_ranges(self.hsv, RED_STRICT)
+
+    def _compute_red_mid(self):
+        return _in_ranges(self.hsv, RED_MID)
+
+    def _compute_red_soft(self):
+        return _in_ranges(self.hsv, RED_SOFT)
+
+    def _compute_red_wide(self):
+        return _in_ranges(self.hsv, RED_WIDE)
+
+    def _compute_red_broad(self):
+        return _in_ranges(self.hsv, RED_BROAD)
+
+    def _compute_blue(self):
+        return _in_ranges(self.hsv, BLUE)
+
+    def _compute_white(self):
+        # белый текст: низкая насыщенность, высокая яркость
+        hsv = self.hsv
+        return ((hsv[:, :, 1] < 60) & (hsv[:, :, 2] > 200)).astype(np.uint8) * 255
+
+    def _compute_bright(self):
+        # просто яркие пиксели (белые цифры по серому)
+        return ((self.gray > 200).astype(np.uint8)) * 255
+
+    hsv       = property(lambda self: self._plane("hsv"))
+    lab       = property(lambda self: self._plane("lab"))
+    gray      = property(lambda self: self._plane("gray"))
+    red       = property(lambda self: self._plane("red"))
+    red_mid   = property(lambda self: self._plane("red_mid"))
+    red_soft  = property(lambda self: self._plane("red_soft"))
+    red_wide  = property(lambda self: self._plane("red_wide"))
+    red_broad = property(lambda self: self._plane("red_broad"))
+    blue      = property(lambda self: self._plane("blue"))
+    white     = property(lambda self: self._plane("white"))
+    bright    = property(lambda self: self._plane("bright"))
@@ -1,7 +1,6 @@
-import cv2, numpy as np, re, argparse, datetime as dt
-import easyocr
-
-reader = easyocr.Reader(["ru","en"], gpu=False, verbose=False)
+import cv2, re, argparse, datetime as dt
+from badge_presence import get_reader
+from color_planes import ColorPlanes
 
 def target_date_str(which):
     d = dt.date.today() + dt.timedelta(days=1 if which=="tomorrow" else 0)
@@ -13,7 +12,7 @@ def _bbox_from_quad(quad):
     return int(x1),int(y1),int(x2-x1),int(y2-y1)
 
 def find_date_bbox(img_bgr, date_text):
-    results = reader.readtext(img_bgr, detail=1, paragraph=False)
+    results = get_reader().readtext(img_bgr, detail=1, paragraph=False)
     wanted = re.sub(r"\s+","", date_text)
     best=None; best_conf=0
     for box,text,conf in results:
@@ -21,22 +20,22 @@ def find_date_bbox(img_bgr, date_text):
             best=_bbox_from_quad(box); best_conf=conf
     return best
 
-def build_masks(img_bgr):
-    hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
+def _red_clean(planes):
     # красный (вкл. оранжево-красный)
-    m1 = cv2.inRange(hsv, np.array([  0, 40, 70]), np.array([28,255,255]))
-    m2 = cv2.inRange(hsv, np.array([160, 40, 70]), np.array([179,255,255]))
-    red = cv2.morphologyEx(m1|m2, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(9,9)), iterations=2)
-    red = cv2.morphologyEx(red, cv2.MORPH_OPEN,  cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(7,7)), iterations=1)
+    red = cv2.morphologyEx(planes.red_wide, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(9,9)), iterations=2)
+    return cv2.morphologyEx(red, cv2.MORPH_OPEN,  cv2.getStructuringElement(cv2.MORPH_ELLIPSE,(7,7)), iterations=1)
 
+def _white_clean(planes):
     # белый текст (низкая насыщенность, высокая яркость)
-    s = hsv[:,:,1]; v = hsv[:,:,2]
-    white = ((s < 60) & (v > 200)).astype(np.uint8)*255
-    white = cv2.morphologyEx(white, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT,(3,3)), iterations=1)
-    return red, white
+    return cv2.morphologyEx(planes.white, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT,(3,3)), iterations=1)
+
+def build_masks(img_bgr, planes=None):
+    """Красная и белая маски кадра; с общим planes считаются один раз на кадр"""
+    planes = planes or ColorPlanes(img_bgr)
+    return planes.derived("date_badge_red", _red_clean), planes.derived("date_badge_white", _white_clean)
 
-def find_red_components(img_bgr):
-    red, _ = build_masks(img_bgr)
+def find_red_components(img_bgr, planes=None):
+    red, _ = build_masks(img_bgr, planes)
     contours,_ = cv2.findContours(red, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     H,W = img_bgr.shape[:2]
     boxes=[]
@@ -47,10 +46,10 @@ def find_red_components(img_bgr):
             boxes.append((x,y,w,h))
     return boxes, red
 
-def choose_badge_right_of_date(img_bgr, date_bbox, boxes):
+def choose_badge_right_of_date(img_bgr, date_bbox, boxes, planes=None):
     """берём ближайший красный бокс СПРАВА от даты, с достаточной долей белого внутри"""
     if not date_bbox: return None, 0
-    red_mask, white_mask = build_masks(img_bgr)
+    red_mask, white_mask = build_masks(img_bgr, planes)
     x,y,w,h = date_bbox
     cx, cy = x + w/2, y + h/2
     H,W = img_bgr.shape[:2]
@@ -95,7 +94,7 @@ def ocr_digits(img_bgr, box, pad_ratio=0.12):
     crop = cv2.resize(crop, (crop.shape[1]*scale, crop.shape[0]*scale), interpolation=cv2.INTER_CUBIC)
     gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
     _,thr = cv2.threshold(gray,0,255,cv2.THRESH_BINARY+cv2.THRESH_OTSU)
-    text = "".join(reader.readtext(thr, detail=0))
+    text = "".join(get_reader().readtext(thr, detail=0))
     m = re.findall(r"\d{1,2}", text)
     return (m[0] if m else ""), crop
 
@@ -112,10 +111,11 @@ def main():
 
     date = target_date_str(args.target)
     date_bbox = find_date_bbox(img, date)
-    boxes, red = find_red_components(img)
+    planes = ColorPlanes(img)
+    boxes, red = find_red_components(img, planes)
     cv2.imwrite(args.mask, red)
 
-    chosen, cand_cnt = choose_badge_right_of_date(img, date_bbox, boxes)
+    chosen, cand_cnt = choose_badge_right_of_date(img, date_bbox, boxes, planes)
     num = ""
     if chosen: num,_ = ocr_digits(img, chosen, pad_ratio=0.12)
 
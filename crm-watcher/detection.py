@@ -0,0 +1,100 @@
+"""
+Анализ скриншота дашборда для одного города.
+Состояние между запусками только на диске (кеши раскладки и кадра), поэтому функцию
+можно выполнять в пуле процессов (см. ocr_executor.py)
+"""
+
+import os
+import cv2, numpy as np
+
+from badge_presence import detect_badge_presence, detect_red_badge_near_date, red_mask_union, date_badge_counts
+from layout_cache import find_dates_cached
+from dom_badges import detect_badge_presence_dom, date_key
+from color_planes import ColorPlanes
+from frame_cache import FrameCache, tile_hashes, changed_tiles, card_region, region_changed
+from artifacts import encode_debug
+
+# CRM_FRAME_CACHE=0 — всегда полный анализ, без повторного использования прошлого вердикта
+USE_FRAME_CACHE = os.getenv("CRM_FRAME_CACHE", "1") != "0"
+
+def analyze_screenshot(png, date_text, city_key, name, timezone, dom_cells=None, debug=True):
+    """
+    Проверяет badge для date_text и считает неразобранные заказы по всем датам.
+    png — байты скриншота (декодируются один раз здесь).
+    Возвращает (present, counts, debug_images, source):
+      counts: "D.MM" -> число (None — badge есть, число не прочиталось),
+      debug_images: {"mask.webp"|"dbg.webp": байты} (расширение по CRM_DEBUG_FORMAT) — только при debug=True,
+      source: "dom" | "dom+pixels" (DOM не увидел badge, скриншот — увидел) | "ocr" | "cache" (кадр не изменился) | "cache-partial" (перепроверены только изменившиеся карточки)
+    """
+    img = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+    if img is None: 
+        raise RuntimeError("Screenshot could not be decoded")
+    
+    # Один перевод в HSV/серый на кадр — дальше все детекторы берут срезы
+    planes = ColorPlanes(img)
+    
+    if dom_cells and date_key(date_text) in dom_cells:
+        present, roi, dbg, red_ratio = detect_badge_presence_dom(dom_cells, date_text, img, debug=debug)
+        print(f"[{name}] Method: DOM ({date_text}: {dom_cells[date_key(date_text)]['count']})")
+        cells = dom_cells
+        source = "dom"
+        if not present:
+            # Поиск badge в DOM эвристический (градиент, ::after, глубокая обёртка — не увидит),
+            # поэтому "нет badge" подтверждаем пикселями у той же даты (срез красной маски, без OCR)
+            cell = dom_cells[date_key(date_text)]
+            found, bbox, pix_dbg, _ = detect_red_badge_near_date(img, cell["date_box"], debug=debug, planes=planes)
+            if found:
+                print(f"[{name}] DOM found no badge for {date_text}, but the screenshot has one — trusting pixels")
+                cells = dict(dom_cells)
+                cells[date_key(date_text)] = dict(cell, badge_box=bbox, count=None)
+                present, roi, dbg, source = True, bbox, pix_dbg, "dom+pixels"
+    else:
+        present, cells, roi, dbg, source = _analyze_ocr(img, planes, date_text, city_key, name, timezone, debug)
+    
+    # Отладочные изображения (запишет вызывающий, если артефакты включены)
+    debug_images = {}
+    if debug and roi:
+        rx,ry,rw,rh = roi
+        ext, data = encode_debug(red_mask_union(img[ry:ry+rh, rx:rx+rw], planes.roi(rx, ry, rw, rh)))
+        debug_images["mask" + ext] = data
+    if dbg is not None:
+        ext, data = encode_debug(dbg)
+        debug_images["dbg" + ext] = data
+    
+    return present, {k: c["count"] for k, c in cells.items()}, debug_images, source
+
+def _analyze_ocr(img, planes, date_text, city_key, name, timezone, debug):
+    """Скриншот+OCR с коротким замыканием по хешу плиток кадра"""
+    cache = FrameCache()
+    hashes = tile_hashes(planes.gray)
+    prev = cache.load(city_key, img.shape)
+    
+    if USE_FRAME_CACHE and prev and prev["date_text"] == date_text and date_text in prev["cells"]:
+        changed = changed_tiles(prev["hashes"], hashes)
+        target = prev["cells"][date_text]
+        if not region_changed(changed, card_region(target["date_box"]), img.shape):
+            # Хеш плитки (64 бита на ~90 px) может не заметить появившийся/пропавший badge, поэтому
+            # наличие badge перепроверяем по пикселям на каждой карточке (срез красной маски, без OCR);
+            # из кеша берём только раскладку дат и числа в неизменившихся badge
+            cells = dict(prev["cells"])
+            stale = {k: c["date_box"] for k, c in cells.items()
+                     if region_changed(changed, card_region(c["date_box"]), img.shape)
+                     or detect_red_badge_near_date(img, c["date_box"], planes=planes)[0] != bool(c.get("badge_box"))}
+            if stale:
+                cells.update(date_badge_counts(img, stale, planes))
+            present, roi, dbg, red_ratio = detect_badge_presence(img, target["date_box"], debug=debug, planes=planes)
+            source = "cache-partial" if stale or changed.any() else "cache"
+            print(f"[{name}] Frame cache hit: {int(changed.sum())}/{changed.size} tiles changed, "
+                  f"re-analysed {len(stale)} date cards ({source})")
+            cache.save(city_key, img.shape, hashes, date_text, present, cells)
+            return present, cells, roi, dbg, source
+    
+    # Один проход OCR по всем датам, целевая дата берётся из общей карты
+    dates, cached = find_dates_cached(img, city_key, timezone, planes=planes)
+    print(f"[{name}] Date labels: {len(dates)} ({'cached layout ROI' if cached else 'full-frame OCR'})")
+    cells = date_badge_counts(img, dates, planes)
+    date_box = cells.get(date_text, {}).get("date_box")
+    present, roi, dbg, red_ratio = detect_badge_presence(img, date_box, debug=debug, planes=planes)
+    if date_box:
+        cache.save(city_key, img.shape, hashes, date_text, present, cells)
+    return present, cells, roi, dbg, "ocr"
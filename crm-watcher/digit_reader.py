@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Лёгкий распознаватель цифр и точки (даты "D.MM", числа в badge) — шаблоны вместо EasyOCR.
+
+Интерфейс как у easyocr.Reader (readtext / recognize), поэтому подключается через get_reader()
+при CRM_OCR_BACKEND=digits. Стартует за миллисекунды и занимает несколько МБ.
+Если слово похоже на дату, но распознано неуверенно, рядом с прочитанными цифрами что-то отброшено
+(или цифр не нашлось вовсе) — весь вызов уходит в EasyOCR (fallback), так что точность не хуже.
+
+Шаблоны вырезаются из скриншотов самой CRM (её шрифт цифр) — обучение обязательно, без него
+бэкенд digits не стартует (разметку глифов делает EasyOCR один раз):
+    python digit_reader.py --train run_artifacts      # -> cache/digit_templates.npz
+    python digit_reader.py --image run_artifacts/dash_warsaw_....png
+"""
+
+import os, re, argparse
+from pathlib import Path
+import cv2, numpy as np
+
+ROOT = Path(__file__).parent
+TEMPLATES_PATH = ROOT / "cache" / "digit_templates.npz"
+
+GLYPH_W, GLYPH_H = 12, 18
+MIN_H, MAX_H = 7, 48
+# Уверенность глифа (корреляция с лучшим шаблоном): ниже ACCEPT слово не принимается; если оно похоже
+# на дату или стоит рядом с принятым словом — весь вызов отдаём EasyOCR
+ACCEPT = float(os.getenv("CRM_DIGITS_ACCEPT", "0.80"))
+DATE_RE = re.compile(r"^\d{1,2}\.\d{2}$")
+
+def _normalize(mask):
+    g = cv2.resize(mask.astype(np.float32), (GLYPH_W, GLYPH_H), interpolation=cv2.INTER_AREA).ravel()
+    g -= g.mean()
+    n = np.linalg.norm(g)
+    return g / n if n else g
+
+def load_templates(path=TEMPLATES_PATH):
+    """Шаблоны, обученные на скриншотах CRM (train); без них распознаватель не работает"""
+    try:
+        data = np.load(path)
+        return data["glyphs"], data["labels"]
+    except (FileNotFoundError, OSError, KeyError, ValueError) as e:
+        raise FileNotFoundError(f"no trained digit templates at {path} ({e}) — "
+                                f"run: python digit_reader.py --train <folder with dashboard screenshots>") from e
+
+def _masks(gray):
+    """Две полярности: тёмный текст на светлом (даты) и светлый на тёмном (цифры в badge)"""
+    thr, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return [(gray < thr).astype(np.uint8), (gray > thr).astype(np.uint8)]
+
+def _components(mask):
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    comps = []
+    for i in range(1, n):
+        x, y, w, h, area = stats[i]
+        if h > MAX_H or w > MAX_H or area < 2:
+            continue
+        comps.append({"box": (int(x), int(y), int(w), int(h)), "mask": labels[y:y+h, x:x+w] == i})
+    return comps
+
+def _words(comps):
+    """
+    Склеивает глифы в слова: общая нижняя линия и небольшой зазор.
+    Возвращает (слова, широкие) — широкие компоненты не цифры (круг badge, рамки, фон, буквы),
+    но рядом со словом из цифр означают, что прочитано не всё.
+    """
+    # цифры выше, чем шире
+    wide = [c for c in comps if MIN_H <= c["box"][3] and c["box"][2] > 0.9 * c["box"][3]]
+    tall = sorted((c for c in comps if MIN_H <= c["box"][3] and c["box"][2] <= 0.9 * c["box"][3]),
+                  key=lambda c: c["box"][0])
+    dots = [c for c in comps if c["box"][3] < MIN_H]
+    words = []
+    for c in tall:
+        x, y, w, h = c["box"]
+        for word in words:
+            lx, ly, lw, lh = word[-1]["box"]
+            if (0 <= x - (lx + lw) <= 0.6 * max(h, lh) and abs((y + h) - (ly + lh)) <= 0.25 * max(h, lh)
+                    and 0.6 < h / lh < 1.6):
+                word.append(c)
+                break
+        else:
+            words.append([c])
+    # "17" и "10" с точкой в зазоре — одно слово (зазор с точкой шире обычного)
+    def joins(prev, word):
+        px = prev[-1]["box"][0] + prev[-1]["box"][2]
+        nx = word[0]["box"][0]
+        h = max(c["box"][3] for c in prev + word)
+        bottom = max(c["box"][1] + c["box"][3] for c in prev)
+        return (0 <= nx - px <= 1.5 * h
+                and abs(max(c["box"][1] + c["box"][3] for c in word) - bottom) <= 0.25 * h
+                and any(px <= d["box"][0] and d["box"][0] + d["box"][2] <= nx
+                        and abs(d["box"][1] + d["box"][3] - bottom) <= 0.2 * h for d in dots))
+    merged = []
+    for word in words:
+        prev = next((m for m in merged if joins(m, word)), None)
+        if prev is not None:
+            prev.extend(word)
+        else:
+            merged.append(word)
+    words = merged
+    for word in words:
+        top = min(c["box"][1] for c in word)
+        bottom = max(c["box"][1] + c["box"][3] for c in word)
+        h = bottom - top
+        # точка: маленький глиф у нижней линии между цифрами
+        for d in dots:
+            dx, dy, dw, dh = d["box"]
+            if (dh <= 0.4 * h and dw <= 0.5 * h and abs((dy + dh) - bottom) <= 0.2 * h
+                    and word[0]["box"][0] < dx < word[-1]["box"][0] + word[-1]["box"][2]):
+                word.append(dict(d, dot=True))
+        word.sort(key=lambda c: c["box"][0])
+    return words, wide
+
+def _box(items):
+    x1 = min(c["box"][0] for c in items)
+    y1 = min(c["box"][1] for c in items)
+    x2 = max(c["box"][0] + c["box"][2] for c in items)
+    y2 = max(c["box"][1] + c["box"][3] for c in items)
+    return x1, y1, x2, y2
+
+def _near(a, b):
+    """b на той же строке, что a, и не дальше полутора высот a по горизонтали"""
+    ax1, ay1, ax2, ay2 = a
+    bx1, by1, bx2, by2 = b
+    if bx1 <= ax1 and by1 <= ay1 and ax2 <= bx2 and ay2 <= by2:
+        return False   # b вокруг a: фон или круг badge, а не соседний глиф
+    h = ay2 - ay1
+    return min(ay2, by2) - max(ay1, by1) > 0.3 * h and bx1 - ax2 <= 1.5 * h and ax1 - bx2 <= 1.5 * h
+
+class DigitReader:
+    """Подмножество easyocr.Reader для цифр и точки с переходом на EasyOCR при низкой уверенности"""
+
+    def __init__(self, fallback=None, templates=None):
+        self.fallback = fallback
+        self._fallback_reader = None
+        self.glyphs, self.labels = templates or load_templates()
+        self.calls = 0
+        self.fallbacks = 0
+
+    def _classify(self, mask):
+        scores = self.glyphs @ _normalize(mask)
+        i = int(np.argmax(scores))
+        return str(self.labels[i]), float(scores[i])
+
+    def _read(self, gray, ox=0, oy=0):
+        """
+        [(quad, text, conf)] для всех уверенно прочитанных слов из цифр; (…, ambiguous) — прочитано
+        не всё: неуверенное слово с точкой (похоже на дату) или отброшенный глиф/слово рядом с принятым
+        """
+        out, ambiguous = [], False
+        for mask in _masks(gray):
+            words, wide = _words(_components(mask))
+            kept, rejected = [], [_box([c]) for c in wide]
+            for word in words:
+                text, conf = "", 1.0
+                for c in word:
+                    if c.get("dot"):
+                        text += "."
+                        continue
+                    ch, score = self._classify(c["mask"])
+                    text += ch
+                    conf = min(conf, score)
+                if not text.strip("."):
+                    continue
+                if conf < ACCEPT:
+                    if "." in text:
+                        ambiguous = True
+                    rejected.append(_box(word))
+                    continue
+                kept.append(_box(word))
+                x1, y1, x2, y2 = kept[-1]
+                out.append(([[x1 + ox, y1 + oy], [x2 + ox, y1 + oy], [x2 + ox, y2 + oy], [x1 + ox, y2 + oy]], text, conf))
+            if any(_near(k, r) for k in kept for r in rejected):
+                ambiguous = True
+        return out, ambiguous
+
+    def _easyocr(self):
+        if self._fallback_reader is None:
+            if self.fallback is None:
+                raise RuntimeError("digit reader is not confident and has no fallback")
+            self._fallback_reader = self.fallback()
+        self.fallbacks += 1
+        return self._fallback_reader
+
+    @staticmethod
+    def _gray(img):
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    def readtext(self, img, detail=1, paragraph=False, **kwargs):
+        self.calls += 1
+        res, ambiguous = self._read(self._gray(img))
+        if ambiguous or not res:
+            return self._easyocr().readtext(img, detail=detail, paragraph=paragraph, **kwargs)
+        return [r[1] for r in res] if detail == 0 else res
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, **kwargs):
+        """По одному результату на прямоугольник [x1, x2, y1, y2] — как easyocr recognize"""
+        self.calls += 1
+        gray = self._gray(img)
+        out = []
+        for x1, x2, y1, y2 in horizontal_list or []:
+            res, ambiguous = self._read(gray[y1:y2, x1:x2], x1, y1)
+            if ambiguous or not res:
+                return self._easyocr().recognize(img, horizontal_list=horizontal_list, free_list=free_list or [],
+                                                 detail=detail, **kwargs)
+            quad, text, conf = max(res, key=lambda r: len(r[1]))
+            out.append((quad, text, conf))
+        return [r[1] for r in out] if detail == 0 else out
+
+def train(corpus, out=TEMPLATES_PATH, per_digit=40):
+    """Вырезает глифы из скриншотов корпуса, подписи — по EasyOCR; сохраняет шаблоны"""
+    from badge_presence import _local_reader, _bbox_from_quad
+    reader = _local_reader()
+    samples = {d: [] for d in "0123456789"}
+    for path in sorted(Path(corpus).glob("*.png")):
+        if path.stem.endswith(("_mask", "_dbg", "_resized")):
+            continue
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        for box, text, conf in reader.readtext(img, detail=1, paragraph=False):
+            text = re.sub(r"\s+", "", str(text)).replace(",", ".")
+            if conf < 0.8 or not (DATE_RE.match(text) or re.fullmatch(r"\d{1,3}", text)):
+                continue
+            x, y, w, h = _bbox_from_quad(box)
+            crop = gray[max(0, y-2):y+h+2, max(0, x-2):x+w+2]
+            digits = text.replace(".", "")
+            for mask in _masks(crop):
+                for word in _words(_components(mask))[0]:
+                    glyphs = [c for c in word if not c.get("dot")]
+                    if len(glyphs) == len(digits):
+                        for d, c in zip(digits, glyphs):
+                            if len(samples[d]) < per_digit:
+                                samples[d].append(_normalize(c["mask"]))
+    missing = [d for d, s in samples.items() if not s]
+    if missing:
+        # Чужой шрифт для недостающих цифр — тихие ошибки распознавания; лучше добавить скриншотов
+        raise SystemExit(f"no samples of digits {''.join(missing)} in {corpus} — add screenshots where they "
+                         f"appear in dates or badges and train again")
+    glyphs = [g for d in samples for g in samples[d]]
+    labels = [d for d in samples for _ in samples[d]]
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(out, glyphs=np.array(glyphs), labels=np.array(labels))
+    print(f"💾 {len(glyphs)} templates -> {out}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--train", help="папка со скриншотами для обучения шаблонов")
+    ap.add_argument("--image", help="распознать цифры на скриншоте (без fallback)")
+    args = ap.parse_args()
+    if args.train:
+        train(args.train)
+    if args.image:
+        img = cv2.imread(args.image)
+        if img is None:
+            raise SystemExit(f"no image at {args.image}")
+        res, ambiguous = DigitReader()._read(DigitReader._gray(img))
+        for quad, text, conf in res:
+            print(f"{text:>8s}  conf={conf:.2f}  at {quad[0]}")
+        print(f"ambiguous={ambiguous} (с fallback такой вызов ушёл бы в EasyOCR)")
+
+if __name__ == "__main__":
+    main()
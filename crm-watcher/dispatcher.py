@@ -0,0 +1,108 @@
+"""
+Очередь проверок городов для одного запуска: общий лимит параллельности, лимит на хост CRM,
+справедливый порядок и дедлайны — чтобы десятки городов укладывались в timeout-minutes workflow.
+
+Порядок: сначала города, которые дольше всех не проверялись (в т.ч. пропущенные в прошлый раз),
+хосты чередуются, чтобы один хост не занимал все слоты.
+"""
+
+import os, json, time, asyncio
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).parent
+STATE_PATH = ROOT / "cache" / "dispatch_state.json"
+
+# Сколько городов одного хоста CRM проверяются одновременно
+MAX_PER_HOST = int(os.getenv("CRM_MAX_PER_HOST", "4"))
+# Потолок на один город (все попытки monitor() вместе), секунд
+CITY_DEADLINE = float(os.getenv("CRM_CITY_DEADLINE", "180"))
+# Бюджет запуска: workflow ограничен 15 минутами, часть уходит на установку зависимостей
+RUN_BUDGET = float(os.getenv("CRM_RUN_BUDGET", "600"))
+# Меньше этого времени до конца бюджета — новый город не начинаем
+MIN_CITY_SECONDS = float(os.getenv("CRM_MIN_CITY_SECONDS", "45"))
+
+def host_of(config):
+    return urlparse(config.get("crm_dashboard") or config.get("crm_url") or "").hostname or ""
+
+class Dispatcher:
+    def __init__(self, max_concurrency, max_per_host=MAX_PER_HOST, city_deadline=CITY_DEADLINE,
+                 run_budget=RUN_BUDGET, state_path=STATE_PATH):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_per_host = max(1, int(max_per_host))
+        self.city_deadline = city_deadline
+        self.run_budget = run_budget
+        self.state_path = Path(state_path)
+        try:
+            self.last_done = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.last_done = {}
+
+    def order(self, monitors):
+        """Давно не проверенные — первыми, хосты по кругу"""
+        by_host = defaultdict(list)
+        for m in sorted(monitors, key=lambda m: self.last_done.get(m.city_key, 0)):
+            by_host[host_of(m.config)].append(m)
+        hosts = sorted(by_host, key=lambda h: self.last_done.get(by_host[h][0].city_key, 0))
+        ordered = []
+        while any(by_host.values()):
+            for h in hosts:
+                if by_host[h]:
+                    ordered.append(by_host[h].pop(0))
+        return ordered
+
+    async def run(self, monitors):
+        """Результаты monitor() в порядке monitors; пропущенные и просроченные — с причиной"""
+        start = time.monotonic()
+        queue = self.order(monitors)
+        running = Counter()
+        cond = asyncio.Condition()
+        results = {}
+
+        async def next_job():
+            async with cond:
+                while queue:
+                    job = next((m for m in queue if running[host_of(m.config)] < self.max_per_host), None)
+                    if job is not None:
+                        queue.remove(job)
+                        running[host_of(job.config)] += 1
+                        return job
+                    await cond.wait()
+                return None
+
+        async def worker():
+            while (m := await next_job()) is not None:
+                left = self.run_budget - (time.monotonic() - start)
+                try:
+                    if left < MIN_CITY_SECONDS:
+                        results[m.city_key] = {"city": m.name, "skipped": True, "reason": "Run budget exhausted"}
+                        continue
+                    timeout = min(self.city_deadline, left)
+                    try:
+                        results[m.city_key] = await asyncio.wait_for(m.monitor(), timeout)
+                        self.last_done[m.city_key] = time.time()
+                    except asyncio.TimeoutError:
+                        print(f"[{m.name}] ⏱️ Deadline {timeout:.0f}s exceeded — aborted")
+                        results[m.city_key] = {"city": m.name, "error": f"deadline {timeout:.0f}s exceeded"}
+                    except Exception as e:
+                        results[m.city_key] = {"city": m.name, "error": str(e)}
+                finally:
+                    async with cond:
+                        running[host_of(m.config)] -= 1
+                        cond.notify_all()
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_concurrency, len(queue)))))
+        self.save()
+        elapsed = time.monotonic() - start
+        done = sum(1 for r in results.values() if "error" not in r and not r.get("skipped"))
+        print(f"⏱️ {done}/{len(monitors)} городов за {elapsed:.0f}s "
+              f"(параллельно {self.max_concurrency}, на хост {self.max_per_host})")
+        return [results[m.city_key] for m in monitors]
+
+    def save(self):
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            self.state_path.write_text(json.dumps(self.last_done), encoding="utf-8")
+        except OSError as e:
+            print(f"WARN: cannot save dispatch state: {e}")
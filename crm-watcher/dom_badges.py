@@ -0,0 +1,212 @@
+"""
+Детекция badge напрямую из DOM/XHR дашборда — без скриншота и OCR.
+Возвращает тот же контракт, что и badge_presence: (present, bbox, dbg, ratio)
+"""
+
+import os, re, json, time, asyncio
+
+# Ищем текстовые узлы вида "D.MM", поднимаемся до карточки даты (но не выше предка, в котором
+# есть другая дата — это уже ряд/календарь) и внутри неё ищем маленький элемент с числом на красном фоне.
+DATE_CELLS_JS = r"""
+() => {
+  const RE = /^\s*(\d{1,2})\.(\d{2})\s*$/;
+  const isRed = (el) => {
+    for (let e = el, i = 0; e && i < 3; e = e.parentElement, i++) {
+      const m = getComputedStyle(e).backgroundColor.match(/rgba?\((\d+),\s*(\d+),\s*(\d+)(?:,\s*([\d.]+))?/);
+      if (!m) continue;
+      const r = +m[1], g = +m[2], b = +m[3], a = m[4] === undefined ? 1 : +m[4];
+      if (a > 0.5 && r > 150 && r - g > 60 && r - b > 60) return true;
+    }
+    return false;
+  };
+  const box = (el) => {
+    const r = el.getBoundingClientRect();
+    return [Math.round(r.x + scrollX), Math.round(r.y + scrollY), Math.round(r.width), Math.round(r.height)];
+  };
+  const found = [];
+  const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+  while (walker.nextNode()) {
+    const m = walker.currentNode.textContent.match(RE);
+    const label = walker.currentNode.parentElement;
+    if (m && label) found.push([m, label]);
+  }
+  const labels = found.map(([, label]) => label);
+  const otherDate = (el, label) => labels.some((l) => l !== label && el.contains(l));
+  const out = [];
+  for (const [m, label] of found) {
+    const lr = label.getBoundingClientRect();
+    if (!lr.width || !lr.height) continue;
+    let card = label;
+    while (card.parentElement && !otherDate(card.parentElement, label)
+           && card.getBoundingClientRect().width < Math.max(150, lr.width * 3)) card = card.parentElement;
+    let badge = null;
+    for (const el of card.querySelectorAll('*')) {
+      if (el === label || el.contains(label) || el.children.length) continue;
+      const txt = (el.textContent || '').trim();
+      if (!/^\d{1,3}$/.test(txt)) continue;
+      const r = el.getBoundingClientRect();
+      if (!r.width || r.width > 60 || r.height > 60 || !isRed(el)) continue;
+      badge = {box: box(el), count: parseInt(txt, 10)};
+      break;
+    }
+    out.push({day: +m[1], month: +m[2], date_box: box(label), card_box: box(card), badge});
+  }
+  return out;
+}
+"""
+
+# Сколько миллисекунд снимок дат/badge должен не меняться, чтобы считать календарь дорисованным
+STABLE_MS = int(os.getenv("CRM_DOM_STABLE_MS", "500"))
+
+# Тот же снимок, что читает read_date_cells: готово, когда он не меняется stableMs подряд
+STABLE_JS = r"""
+(stableMs) => {
+  const cells = (""" + DATE_CELLS_JS + r""")();
+  if (!cells.length) return false;
+  const sig = JSON.stringify(cells);
+  const now = performance.now();
+  const s = window.__crmStable;
+  if (!s || s.sig !== sig) { window.__crmStable = {sig, since: now}; return false; }
+  return now - s.since >= stableMs;
+}
+"""
+
+# Имена полей в JSON ответах дашборда, которые означают неразобранные заказы
+COUNT_KEYS = ("unassigned", "unassigned_count", "not_assigned", "unprocessed", "unprocessed_count")
+DATE_RE = re.compile(r"^(?:\d{4}-(\d{2})-(\d{2})|(\d{1,2})\.(\d{2}))")
+
+def date_key(text):
+    """Нормализует "03.11" / "3.11" / "2025-11-03" к виду "3.11" (как target_date_str)"""
+    m = DATE_RE.match(str(text).strip())
+    if not m:
+        return None
+    if m.group(1):
+        return f"{int(m.group(2))}.{m.group(1)}"
+    return f"{int(m.group(3))}.{m.group(4)}"
+
+class XhrRecorder:
+    """
+    Слушает JSON ответы страницы и вытаскивает из них счётчики по датам.
+    С url_pattern ещё и следит за запросами календаря в полёте (wait_idle).
+    """
+
+    def __init__(self, page, url_pattern=None):
+        self.url_re = re.compile(url_pattern) if url_pattern else None
+        self.payloads = []
+        self.pending = set()
+        self.seen = 0
+        page.on("response", self._on_response)
+        if self.url_re:
+            page.on("request", self._on_request)
+            page.on("requestfinished", self._on_done)
+            page.on("requestfailed", self._on_done)
+
+    def _on_request(self, req):
+        if self.url_re.search(req.url):
+            self.pending.add(req)
+            self.seen += 1
+
+    def _on_done(self, req):
+        self.pending.discard(req)
+
+    async def wait_idle(self, timeout_ms=10000):
+        """Ждёт, пока запросы календаря (хотя бы один) завершатся; False — не дождались"""
+        if not self.url_re:
+            return True
+        deadline = time.monotonic() + timeout_ms / 1000
+        while self.pending or not self.seen:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def _on_response(self, res):
+        if self.url_re and not self.url_re.search(res.url):
+            return
+        if "json" not in (res.headers.get("content-type") or ""):
+            return
+        try:
+            self.payloads.append(json.loads(await res.text()))
+        except Exception:
+            pass
+
+    def counts(self):
+        found = {}
+        for payload in self.payloads:
+            _walk_counts(payload, found)
+        return found
+
+def _walk_counts(node, found):
+    if isinstance(node, dict):
+        key = None
+        for v in node.values():
+            if isinstance(v, str) and date_key(v):
+                key = date_key(v); break
+        if key:
+            for k in COUNT_KEYS:
+                if isinstance(node.get(k), (int, float)):
+                    found[key] = int(node[k]); break
+        for v in node.values():
+            _walk_counts(v, found)
+    elif isinstance(node, list):
+        for v in node:
+            _walk_counts(v, found)
+
+async def wait_calendar_ready(page, xhr=None, timeout_ms=15000, stable_ms=STABLE_MS):
+    """
+    Готовность календаря по событиям, без фиксированных пауз:
+    ответы календарного XHR завершились (если задан calendar_xhr_pattern) и
+    снимок дат/badge в DOM не меняется stable_ms. Возвращает затраченные секунды.
+    """
+    start = time.monotonic()
+    if xhr is not None and not await xhr.wait_idle(timeout_ms):
+        print(f"WARN: calendar XHR still pending after {timeout_ms} ms")
+    left = max(1000, timeout_ms - int((time.monotonic() - start) * 1000))
+    await page.wait_for_function(STABLE_JS, arg=stable_ms, polling=100, timeout=left)
+    return time.monotonic() - start
+
+async def read_date_cells(page, xhr=None):
+    """Словарь "D.MM" -> {date_box, card_box, badge_box, count} по данным DOM (+XHR, если есть)"""
+    cells = {}
+    for c in await page.evaluate(DATE_CELLS_JS):
+        key = f"{c['day']}.{c['month']:02d}"
+        if key in cells:
+            continue
+        badge = c.get("badge")
+        cells[key] = {
+            "date_box": tuple(c["date_box"]),
+            "card_box": tuple(c["card_box"]),
+            "badge_box": tuple(badge["box"]) if badge else None,
+            "count": badge["count"] if badge else 0,
+        }
+    if xhr is not None:
+        # Счётчик из API надёжнее, чем то, что нарисовано
+        for key, count in xhr.counts().items():
+            if key in cells:
+                cells[key]["count"] = count
+    return cells
+
+def detect_badge_presence_dom(cells, date_text, img_bgr=None, debug=False):
+    """
+    Тот же контракт, что detect_badge_presence: (present, bbox, dbg, ratio).
+    bbox — badge (если есть) в координатах скриншота.
+    """
+    cell = cells.get(date_key(date_text)) if cells else None
+    if not cell:
+        return False, None, None, 0.0
+
+    present = cell["count"] > 0
+    bbox = cell["badge_box"] if present else None
+
+    dbg = None
+    if debug and img_bgr is not None:
+        import cv2
+        dbg = img_bgr.copy()
+        x, y, w, h = cell["date_box"]
+        cv2.rectangle(dbg, (x, y), (x+w, y+h), (255, 255, 0), 2)
+        if bbox:
+            bx, by, bw, bh = bbox
+            cv2.rectangle(dbg, (bx, by), (bx+bw, by+bh), (0, 0, 255), 3)
+        label = f"DOM: {cell['count']}" if present else "DOM: NO BADGE"
+        cv2.putText(dbg, label, (x, max(15, y-10)), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255) if present else (0, 255, 0), 2)
+    return present, bbox, dbg, 0.0
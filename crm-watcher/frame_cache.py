@@ -0,0 +1,78 @@
+"""
+Кеш последнего кадра по городу: dHash по плиткам + последний результат детекции.
+Если плитки вокруг карточки нужной даты не изменились — повторно используем вердикт,
+заново анализируем только карточки, попавшие в изменившиеся плитки.
+"""
+
+import os, json
+from pathlib import Path
+import cv2, numpy as np
+
+from badge_presence import CARD_WIDTH
+
+ROOT = Path(__file__).parent
+CACHE_DIR = ROOT / "cache"
+
+TILE_COLS, TILE_ROWS = 16, 5
+# Сколько бит из 64 может отличаться, чтобы плитка считалась той же (шум рендеринга/антиалиасинг)
+MAX_BITS = int(os.getenv("CRM_FRAME_HASH_BITS", "3"))
+
+def tile_hashes(gray, cols=TILE_COLS, rows=TILE_ROWS):
+    """dHash 64 бита для каждой плитки сетки cols×rows — одним resize на весь серый кадр"""
+    small = cv2.resize(gray, (cols * 9, rows * 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1])                       # rows*8 × cols*9-1
+    bits = np.delete(bits, np.s_[8::9], axis=1)                 # убираем сравнения через границу плиток
+    bits = bits.reshape(rows, 8, cols, 8).transpose(0, 2, 1, 3).reshape(rows, cols, 64)
+    return np.packbits(bits, axis=-1).view(">u8")[..., 0]       # rows × cols uint64
+
+def changed_tiles(prev, cur, max_bits=MAX_BITS):
+    """Булева матрица изменившихся плиток"""
+    x = np.bitwise_xor(prev, cur)
+    counts = np.unpackbits(x.astype(">u8").view(np.uint8).reshape(*x.shape, 8), axis=-1).sum(-1)
+    return counts > max_bits
+
+def card_region(date_box):
+    """Область карточки даты вместе с badge (та же геометрия, что в detect_red_badge_near_date)"""
+    x, y, w, h = date_box
+    return (x - 10, y - 10, CARD_WIDTH + 40, 80)
+
+def region_changed(changed, region, shape):
+    H, W = shape[:2]
+    rows, cols = changed.shape
+    x, y, w, h = region
+    c1, c2 = max(0, x * cols // W), min(cols - 1, (x + w) * cols // W)
+    r1, r2 = max(0, y * rows // H), min(rows - 1, (y + h) * rows // H)
+    return bool(changed[r1:r2 + 1, c1:c2 + 1].any())
+
+class FrameCache:
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+
+    def path(self, city_key):
+        return self.root / f"frame_{city_key}.json"
+
+    def load(self, city_key, shape):
+        try:
+            data = json.loads(self.path(city_key).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if tuple(data.get("shape", ())) != tuple(shape[:2]):
+            return None
+        data["hashes"] = np.array([int(h, 16) for h in data["hashes"]], dtype=np.uint64).reshape(TILE_ROWS, TILE_COLS)
+        for c in data["cells"].values():
+            c["date_box"] = tuple(c["date_box"])
+            c["badge_box"] = tuple(c["badge_box"]) if c.get("badge_box") else None
+        return data
+
+    def save(self, city_key, shape, hashes, date_text, present, cells):
+        self.root.mkdir(parents=True, exist_ok=True)
+        data = {
+            "shape": list(shape[:2]),
+            "hashes": [f"{int(h):016x}" for h in hashes.ravel()],
+            "date_text": date_text,
+            "present": bool(present),
+            "cells": {k: {"date_box": list(c["date_box"]),
+                          "badge_box": list(c["badge_box"]) if c.get("badge_box") else None,
+                          "count": c["count"]} for k, c in cells.items()},
+        }
+        self.path(city_key).write_text(json.dumps(data), encoding="utf-8")
@@ -0,0 +1,112 @@
+"""
+Кеш раскладки календаря: где на скриншоте стоят карточки дат (по городу и размеру кадра).
+Распознаются только маленькие куски вокруг известных карточек (одним пакетом, без детектора текста),
+полный проход — если кешированная раскладка не подтвердилась или раз в CRM_LAYOUT_FULL_SCAN_EVERY
+проверок (иначе новые даты вне кешированных слотов не найдутся никогда).
+"""
+
+import os, json, datetime as dt
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from badge_presence import get_reader, find_all_date_bboxes, date_labels
+from color_planes import ColorPlanes
+
+ROOT = Path(__file__).parent
+CACHE_DIR = ROOT / "cache"
+
+# Поля вокруг кешированной метки даты (карточки могут чуть сдвигаться)
+PAD_X, PAD_Y = 30, 12
+# Каждая N-я проверка по кешу — полный проход (0 — только когда раскладка не подтвердилась)
+FULL_SCAN_EVERY = int(os.getenv("CRM_LAYOUT_FULL_SCAN_EVERY", "10"))
+
+def label_weekday(key, timezone="Europe/Warsaw"):
+    """День недели для метки "D.MM" (год — ближайший к сегодняшнему дню)"""
+    today = dt.datetime.now(ZoneInfo(timezone)).date()
+    day, month = (int(p) for p in key.split("."))
+    best = None
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            d = dt.date(year, month, day)
+        except ValueError:
+            continue
+        if best is None or abs((d - today).days) < abs((best - today).days):
+            best = d
+    return best.weekday() if best else None
+
+class LayoutCache:
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+
+    def path(self, city_key, shape):
+        h, w = shape[:2]
+        return self.root / f"layout_{city_key}_{w}x{h}.json"
+
+    def _read(self, city_key, shape):
+        try:
+            data = json.loads(self.path(city_key, shape).read_text(encoding="utf-8"))
+            return data if data.get("slots") else None
+        except (FileNotFoundError, ValueError, AttributeError):
+            return None
+
+    def load(self, city_key, shape):
+        data = self._read(city_key, shape)
+        return data["slots"] if data else None
+
+    def hits(self, city_key, shape):
+        """Сколько проверок прошло по этой раскладке после последнего полного прохода"""
+        data = self._read(city_key, shape)
+        return data.get("hits", 0) if data else 0
+
+    def hit(self, city_key, shape):
+        data = self._read(city_key, shape)
+        if data:
+            data["hits"] = data.get("hits", 0) + 1
+            self.path(city_key, shape).write_text(json.dumps(data), encoding="utf-8")
+
+    def save(self, city_key, shape, dates, timezone):
+        slots = [{"weekday": label_weekday(k, timezone), "box": list(box)} for k, box in dates.items()]
+        slots.sort(key=lambda s: (s["box"][1], s["box"][0]))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path(city_key, shape).write_text(json.dumps({"slots": slots, "hits": 0}), encoding="utf-8")
+
+def ocr_slots(img_bgr, slots, planes=None):
+    """
+    Распознавание только в окрестности кешированных карточек — одним пакетным вызовом recognize
+    (как read_badge_numbers), без детектора текста; координаты — в кадре целиком.
+    Возвращает список (слот, "D.MM" или None, bbox) в порядке слотов.
+    """
+    H, W = img_bgr.shape[:2]
+    boxes = []
+    for slot in slots:
+        x, y, w, h = slot["box"]
+        boxes.append([max(0, x - PAD_X), min(W, x + w + PAD_X), max(0, y - PAD_Y), min(H, y + h + PAD_Y)])
+    gray = (planes or ColorPlanes(img_bgr)).gray
+    res = get_reader().recognize(gray, horizontal_list=boxes, free_list=[], detail=1, batch_size=len(boxes),
+                                 paragraph=False)
+    found = []
+    for slot, (box, text, _) in zip(slots, res):
+        labels = date_labels(box, text)
+        # recognize возвращает рамку куска с полями — точная рамка метки та, что в кеше
+        found.append((slot, labels[0][0], tuple(slot["box"])) if labels else (slot, None, None))
+    return found
+
+def find_dates_cached(img_bgr, city_key, timezone="Europe/Warsaw", cache=None, planes=None):
+    """То же, что find_all_date_bboxes, но через кеш раскладки. Возвращает (dates, from_cache)"""
+    cache = cache or LayoutCache()
+    slots = cache.load(city_key, img_bgr.shape)
+    if slots and FULL_SCAN_EVERY and cache.hits(city_key, img_bgr.shape) + 1 >= FULL_SCAN_EVERY:
+        print(f"[layout:{city_key}] Periodic full scan (every {FULL_SCAN_EVERY} checks)")
+        slots = None
+    if slots:
+        found = ocr_slots(img_bgr, slots, planes)
+        # Раскладка валидна, если в каждом слоте нашлась дата с тем же днём недели
+        ok = [key for slot, key, _ in found if key and label_weekday(key, timezone) == slot["weekday"]]
+        if len(ok) == len(slots):
+            cache.hit(city_key, img_bgr.shape)
+            return {key: bbox for _, key, bbox in found}, True
+        print(f"[layout:{city_key}] Cached layout did not validate ({len(ok)}/{len(slots)} slots) — full scan")
+    dates = find_all_date_bboxes(img_bgr)
+    if dates:
+        cache.save(city_key, img_bgr.shape, dates, timezone)
+    return dates, False
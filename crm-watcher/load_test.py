@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон multi_crm_monitor.py против локальной заглушки (mock_crm.py).
+
+Для каждого размера (по умолчанию 1, 10, 100 городов):
+  - во временной папке копия crm-watcher/*.py + сгенерированный multi_crm_config.py с N городами
+    (состояние — сессии, кеши, артефакты — не смешивается с настоящим),
+  - монитор запускается отдельным процессом с TELEGRAM_API_BASE на заглушку,
+  - снимаются: время запуска, пропускная способность, p50/p95/p99 по городам (из metrics.jsonl),
+    пиковая RSS всего дерева процессов (Python + Chromium + пул OCR), отправленные sendPhoto
+    против ожидаемых алертов.
+
+    python load_test.py --cities 1,10,100 --latency-ms 150 --badge-every 3 --out load_result.json
+
+--detection-mode ocr выключает путь через DOM/XHR: badge ищутся только по скриншоту (пиксели + OCR),
+так прогон ловит регрессии в запасном пути детекции.
+"""
+
+import os, sys, json, time, shutil, asyncio, argparse, tempfile, datetime as dt
+from pathlib import Path
+
+import mock_crm
+from benchmark import percentiles, _git_commit
+
+ROOT = Path(__file__).parent
+TOKEN = "000000:mock"
+
+CONFIG_TEMPLATE = '''"""Сгенерировано load_test.py"""
+CRM_CONFIGS = {configs!r}
+TELEGRAM_BOT_TOKEN = {token!r}
+'''
+
+def make_configs(n, base, shared_login=False, timezone="Europe/Warsaw"):
+    return {
+        f"sim_c{i}": {
+            "name": f"Sim {i}",
+            "crm_url": f"{base}/login",
+            "crm_dashboard": f"{base}/?city=sim_c{i}",
+            "login": "shared@example.com" if shared_login else f"user{i}@example.com",
+            "password": "secret",
+            "telegram_chat_id": str(1000 + i),
+            "timezone": timezone,
+            "notification_hours": list(range(24)),
+            "calendar_xhr_pattern": "/api/calendar",
+            "enabled": True,
+        }
+        for i in range(n)
+    }
+
+def _tree_rss_mb(pid):
+    """Суммарная RSS процесса и всех потомков (Linux /proc); None, если /proc нет"""
+    proc = Path("/proc")
+    if not proc.exists():
+        return None
+    children = {}
+    for p in proc.iterdir():
+        if not p.name.isdigit():
+            continue
+        try:
+            ppid = int((p / "stat").read_text().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(p.name))
+    total, stack = 0, [pid]
+    while stack:
+        cur = stack.pop()
+        try:
+            for line in (proc / str(cur) / "status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+                    break
+        except OSError:
+            pass
+        stack.extend(children.get(cur, []))
+    return total / 1024
+
+def city_latencies(metrics_path):
+    """Время от первого до последнего span каждого города, секунды"""
+    spans = {}
+    try:
+        lines = Path(metrics_path).read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return []
+    for line in lines:
+        row = json.loads(line)
+        if not row.get("city"):
+            continue
+        start = dt.datetime.fromisoformat(row["ts"]).timestamp()
+        end = start + row["duration_ms"] / 1000
+        lo, hi = spans.get(row["city"], (start, end))
+        spans[row["city"]] = (min(lo, start), max(hi, end))
+    return [hi - lo for lo, hi in spans.values()]
+
+async def run_scale(n, mock, base, args):
+    work = Path(tempfile.mkdtemp(prefix=f"crm_load_{n}_"))
+    for src in ROOT.glob("*.py"):
+        if src.name != "multi_crm_config.py":
+            shutil.copy2(src, work / src.name)
+    configs = make_configs(n, base, args.shared_login)
+    (work / "multi_crm_config.py").write_text(CONFIG_TEMPLATE.format(configs=configs, token=TOKEN), encoding="utf-8")
+
+    env = dict(os.environ, TELEGRAM_API_BASE=base, CRM_METRICS_FILE=str(work / "metrics.jsonl"),
+               CRM_SAVE_ARTIFACTS="1" if args.keep_artifacts else "0", CRM_SCHEDULE_JITTER="0",
+               CRM_DETECTION_MODE=args.detection_mode, PYTHONUNBUFFERED="1")
+    mock.calls.clear()
+    requests_before, logins_before = mock.requests, mock.logins
+
+    t0 = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(sys.executable, "multi_crm_monitor.py", cwd=work, env=env,
+                                                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    peak = 0.0
+
+    async def sample():
+        nonlocal peak
+        while True:
+            rss = await asyncio.to_thread(_tree_rss_mb, proc.pid)
+            if rss:
+                peak = max(peak, rss)
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample())
+    out, _ = await proc.communicate()
+    wall = time.monotonic() - t0
+    sampler.cancel()
+    (work / "monitor.log").write_bytes(out)
+
+    expected = {c["telegram_chat_id"] for k, c in configs.items() if mock.expected_alert(k)}
+    sent = {c["chat_id"] for c in mock.calls if c["method"] == "sendPhoto"}
+    lat = city_latencies(work / "metrics.jsonl")
+    result = {
+        "cities": n,
+        "detection_mode": args.detection_mode,
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 2),
+        "cities_per_min": round(n / wall * 60, 1) if wall else None,
+        "city_latency": percentiles(lat),
+        "peak_rss_mb": round(peak, 1) if peak else None,
+        "crm_requests": mock.requests - requests_before,
+        "logins": mock.logins - logins_before,
+        "alerts_expected": len(expected),
+        "alerts_sent": len(sent),
+        "missed_alerts": sorted(expected - sent),
+        "false_alerts": sorted(sent - expected),
+        "uploads": sum(1 for c in mock.calls if c["upload"]),
+        "workdir": str(work),
+    }
+    if not args.keep_artifacts and proc.returncode == 0 and not result["missed_alerts"]:
+        shutil.rmtree(work, ignore_errors=True)
+        result["workdir"] = None
+    return result
+
+async def main_async(args):
+    mock = mock_crm.MockCRM(badge_every=args.badge_every, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            fail_rate=args.fail_rate, tg_429_rate=args.tg_429_rate, seed=args.seed)
+    runner = await mock_crm.start(mock, port=args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    results = []
+    try:
+        for n in args.cities:
+            print(f"🚦 {n} городов...")
+            res = await run_scale(n, mock, base, args)
+            lat = res["city_latency"] or {}
+            print(f"   {res['wall_s']}s, {res['cities_per_min']} городов/мин, p50={lat.get('p50_ms')}ms "
+                  f"p99={lat.get('p99_ms')}ms, RSS={res['peak_rss_mb']}MB, логинов={res['logins']}, "
+                  f"алерты {res['alerts_sent']}/{res['alerts_expected']} (пропущено {len(res['missed_alerts'])}, "
+                  f"лишних {len(res['false_alerts'])})")
+            if res["workdir"]:
+                print(f"   лог и состояние: {res['workdir']}")
+            results.append(res)
+    finally:
+        await runner.cleanup()
+    return results
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", default="1,10,100", type=lambda s: [int(x) for x in s.split(",") if x])
+    ap.add_argument("--port", type=int, default=8780)
+    ap.add_argument("--latency-ms", type=float, default=100)
+    ap.add_argument("--jitter-ms", type=float, default=50)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--tg-429-rate", type=float, default=0.0)
+    ap.add_argument("--badge-every", type=int, default=3)
+    ap.add_argument("--detection-mode", choices=("auto", "ocr"), default="auto",
+                    help="ocr — без DOM/XHR, только скриншот (пиксели + OCR)")
+    ap.add_argument("--shared-login", action="store_true", help="все города под одним логином (группа логина)")
+    ap.add_argument("--keep-artifacts", action="store_true")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="load_result.json")
+    args = ap.parse_args()
+
+    results = asyncio.run(main_async(args))
+    Path(args.out).write_text(json.dumps({
+        "commit": _git_commit(),
+        "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "cpu_count": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "runs": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 Saved: {args.out}")
+
+if __name__ == "__main__":
+    main()
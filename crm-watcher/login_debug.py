@@ -2,6 +2,7 @@ import os, asyncio, json, time
 from pathlib import Path
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+import login_discovery
 
 load_dotenv()
 URL      = os.getenv("CRM_URL")
@@ -53,21 +54,8 @@ async def list_inputs_in_frame(frame, tag="input"):
     }""", tag)
 
 async def find_in_all_frames(context, selectors):
-    for page in context.pages:
-        # check main frame
-        for sel in selectors:
-            try:
-                await page.locator(sel).first.wait_for(timeout=1500)
-                return page.main_frame, sel
-            except: pass
-        # check child frames
-        for fr in page.frames:
-            for sel in selectors:
-                try:
-                    await fr.wait_for_selector(sel, timeout=1500)
-                    return fr, sel
-                except: pass
-    return None, None
+    # гонка всех селекторов по всем фреймам всех страниц (login_discovery)
+    return await login_discovery.find(context, selectors, timeout_ms=1500)
 
 async def debug_login():
     async with async_playwright() as p:
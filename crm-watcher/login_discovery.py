@@ -0,0 +1,173 @@
+"""
+Поиск полей формы логина: все кандидаты сразу, во всех фреймах.
+
+1. Один evaluate на фрейм проверяет все CSS-кандидаты разом (первый видимый по порядку).
+2. Если форма ещё не отрисована — гонка wait_for_selector по всем (фрейм × селектор),
+   включая text=/role= селекторы Playwright; побеждает первый, остальные отменяются.
+3. Общие запасные селекторы (любая кнопка формы) — только если ни один точный кандидат не нашёлся:
+   первая кнопка формы бывает "показать пароль" и т.п.
+4. Победивший селектор запоминается для хоста CRM (cache/login_selectors.json)
+   и в следующий раз проверяется первым; если логин не ушёл со страницы входа — забывается.
+"""
+
+import json, asyncio
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).parent
+MEMORY_PATH = ROOT / "cache" / "login_selectors.json"
+
+EMAIL_SELECTORS = [
+    'input[name="email"]', 'input[type="email"]', 'input[id*="email" i]', 'input[name*="login" i]',
+    'input[placeholder*="mail" i]', 'input[placeholder*="логин" i]',
+]
+PASSWORD_SELECTORS = [
+    'input[name="password"]', 'input[type="password"]', 'input[id*="pass" i]',
+    'input[placeholder*="парол" i]',
+]
+SUBMIT_SELECTORS = [
+    'button[type="submit"]', 'input[type="submit"]',
+    'button:has-text("Войти")', 'role=button[name=/^(Войти|Sign in|Login)$/i]',
+    'text=/^Войти$/i', 'button:has-text("Sign in")', 'button:has-text("Login")',
+]
+CANDIDATES = {"email": EMAIL_SELECTORS, "password": PASSWORD_SELECTORS, "submit": SUBMIT_SELECTORS}
+# Проверяются после всех точных кандидатов (включая text=/role=)
+FALLBACKS = {"submit": ['form button']}
+
+# Индекс первого CSS-кандидата с видимым элементом; не-CSS селекторы (text=, :has-text) пропускаются
+FIRST_VISIBLE_JS = """
+(sels) => {
+  const visible = (el) => {
+    const r = el.getBoundingClientRect(), st = getComputedStyle(el);
+    return r.width > 0 && r.height > 0 && st.visibility !== 'hidden' && st.display !== 'none';
+  };
+  for (let i = 0; i < sels.length; i++) {
+    let els;
+    try { els = document.querySelectorAll(sels[i]); } catch (e) { continue; }
+    for (const el of els) if (visible(el)) return i;
+  }
+  return -1;
+}
+"""
+
+def host_of(url):
+    return urlparse(url or "").netloc
+
+class SelectorMemory:
+    """Какой селектор сработал на каком хосте: {host: {kind: selector}}"""
+
+    def __init__(self, path=MEMORY_PATH):
+        self.path = Path(path)
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+
+    def get(self, host, kind):
+        return self.data.get(host, {}).get(kind)
+
+    def remember(self, host, kind, selector):
+        if not host or self.get(host, kind) == selector:
+            return
+        self.data.setdefault(host, {})[kind] = selector
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"WARN: cannot save login selectors: {e}")
+
+    def forget(self, host):
+        if self.data.pop(host, None) is None:
+            return
+        try:
+            self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        except OSError as e:
+            print(f"WARN: cannot save login selectors: {e}")
+
+_memory = None
+
+def memory():
+    global _memory
+    if _memory is None:
+        _memory = SelectorMemory()
+    return _memory
+
+def forget(host):
+    """Логин с запомненными селекторами не удался — в следующий раз ищем заново"""
+    memory().forget(host)
+
+def _frames(target):
+    """Все фреймы страницы или всех страниц контекста (главный фрейм первым)"""
+    if hasattr(target, "frames"):
+        return list(target.frames)
+    return [fr for page in target.pages for fr in page.frames]
+
+def _ordered(selectors, preferred):
+    if preferred and preferred in selectors:
+        return [preferred] + [s for s in selectors if s != preferred]
+    return [preferred] + list(selectors) if preferred else list(selectors)
+
+async def _first_visible(frames, selectors):
+    """Один запрос на фрейм по всем CSS-кандидатам"""
+    for fr in frames:
+        try:
+            i = await fr.evaluate(FIRST_VISIBLE_JS, selectors)
+        except Exception:
+            continue   # фрейм отсоединился / навигация
+        if i >= 0:
+            return fr, selectors[i]
+    return None, None
+
+async def _race(frames, selectors, timeout_ms):
+    """Гонка wait_for_selector по всем фреймам и кандидатам; при ничьей — по порядку кандидатов"""
+    tasks = {}
+    for fr in frames:
+        for rank, sel in enumerate(selectors):
+            t = asyncio.ensure_future(fr.wait_for_selector(sel, state="visible", timeout=timeout_ms))
+            tasks[t] = (rank, fr, sel)
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            won = [tasks[t] for t in done if not t.cancelled() and t.exception() is None and t.result() is not None]
+            if won:
+                _, fr, sel = min(won, key=lambda w: w[0])
+                return fr, sel
+        return None, None
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def find(target, selectors, kind=None, host=None, timeout_ms=5000, fallbacks=None):
+    """(frame, selector) первого найденного кандидата или (None, None); target — страница или контекст"""
+    frames = _frames(target)
+    if host is None and hasattr(target, "url"):
+        host = host_of(target.url)
+    selectors = _ordered(selectors, memory().get(host, kind) if kind else None)
+    fr, sel = await _first_visible(frames, selectors)
+    if sel is None:
+        fr, sel = await _race(frames, selectors, timeout_ms)
+    if sel is None and fallbacks:
+        fr, sel = await _first_visible(frames, fallbacks)
+    if sel is not None and kind:
+        memory().remember(host, kind, sel)
+    return fr, sel
+
+async def fill(target, kind, value, host=None, selectors=None, timeout_ms=5000):
+    """Заполняет первое найденное поле kind ("email"/"password"); возвращает селектор или None"""
+    fr, sel = await find(target, selectors or CANDIDATES[kind], kind, host, timeout_ms,
+                         None if selectors else FALLBACKS.get(kind))
+    if sel is None:
+        return None
+    await fr.fill(sel, value, timeout=timeout_ms)
+    return sel
+
+async def click(target, kind="submit", host=None, selectors=None, timeout_ms=5000):
+    """Кликает первую найденную кнопку; возвращает селектор или None"""
+    fr, sel = await find(target, selectors or CANDIDATES[kind], kind, host, timeout_ms,
+                         None if selectors else FALLBACKS.get(kind))
+    if sel is None:
+        return None
+    await fr.click(sel, timeout=timeout_ms)
+    return sel
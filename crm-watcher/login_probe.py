@@ -1,6 +1,7 @@
 import os, asyncio, json
 from dotenv import load_dotenv
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+import login_discovery
 
 load_dotenv()
 URL      = os.getenv("CRM_URL")
@@ -27,18 +28,17 @@ DASH_PROBES = [
 ]
 
 async def try_fill(page, selectors, value):
-    for sel in selectors:
-        try:
-            await page.fill(sel, value, timeout=3000); return sel
-        except Exception: continue
-    return None
+    # все кандидаты разом во всех фреймах (login_discovery)
+    try:
+        return await login_discovery.fill(page, None, value, selectors=selectors, timeout_ms=3000)
+    except Exception:
+        return None
 
 async def try_click(page, selectors):
-    for sel in selectors:
-        try:
-            await page.click(sel, timeout=3000); return sel
-        except Exception: continue
-    return None
+    try:
+        return await login_discovery.click(page, None, selectors=selectors, timeout_ms=3000)
+    except Exception:
+        return None
 
 async def probe():
     async with async_playwright() as p:
@@ -0,0 +1,145 @@
+"""
+Структурированные тайминги стадий мониторинга: JSON lines + гистограммы для Prometheus
+
+    with span("login", city="warsaw", attempt=1):
+        ...
+
+Каждая стадия пишет строку в $CRM_METRICS_FILE (по умолчанию run_artifacts/metrics.jsonl,
+ротация по размеру — CRM_METRICS_MAX_MB)
+и попадает в гистограмму crm_stage_duration_seconds{stage,city}. В режиме --daemon
+гистограммы отдаются по HTTP на /metrics, если задан CRM_METRICS_PORT.
+"""
+
+import os, json, time, threading, datetime as dt
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+METRICS_FILE = os.getenv("CRM_METRICS_FILE", str(ROOT / "run_artifacts" / "metrics.jsonl"))
+METRICS_PORT = int(os.getenv("CRM_METRICS_PORT", "0"))
+# Больше этого размера metrics.jsonl переименовывается в metrics.jsonl.1 (одна старая копия):
+# на диске не больше двух таких файлов и в режиме демона
+METRICS_MAX_MB = float(os.getenv("CRM_METRICS_MAX_MB", "10"))
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_lock = threading.Lock()
+_histograms = {}   # (stage, city) -> [counts по бакетам..., +Inf], sum, count
+_errors = {}       # (stage, city) -> count
+RUN_ID = dt.datetime.now().strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}"
+
+def _observe(stage, city, seconds, ok):
+    key = (stage, city or "")
+    with _lock:
+        h = _histograms.setdefault(key, {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h["buckets"][i] += 1
+        h["buckets"][-1] += 1
+        h["sum"] += seconds
+        h["count"] += 1
+        if not ok:
+            _errors[key] = _errors.get(key, 0) + 1
+
+def _write(record):
+    if not METRICS_FILE:
+        return
+    try:
+        Path(METRICS_FILE).parent.mkdir(parents=True, exist_ok=True)
+        with _lock:
+            with open(METRICS_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                size = f.tell()
+            if METRICS_MAX_MB and size > METRICS_MAX_MB * 1024 * 1024:
+                os.replace(METRICS_FILE, METRICS_FILE + ".1")
+    except OSError as e:
+        print(f"WARN: metrics write failed: {e}")
+
+def record(stage, seconds, city=None, attempt=None, status="ok", started_at=None, **tags):
+    """Записывает уже измеренную длительность стадии (для мест, где with-блок неудобен)"""
+    _observe(stage, city, seconds, status == "ok")
+    row = {"ts": (started_at or dt.datetime.now(dt.timezone.utc)).isoformat(), "run": RUN_ID,
+           "stage": stage, "city": city, "attempt": attempt,
+           "duration_ms": round(seconds * 1000, 1), "status": status}
+    row.update(tags)
+    _write(row)
+
+@contextmanager
+def span(stage, city=None, attempt=None, **tags):
+    """Замер стадии; ошибка внутри помечает span как status=error и пробрасывается дальше"""
+    start = time.perf_counter()
+    started_at = dt.datetime.now(dt.timezone.utc)
+    status = "ok"
+    try:
+        yield tags   # можно дописать теги по ходу: with span(...) as t: t["source"] = ...
+    except BaseException as e:
+        status = "error"
+        tags["error"] = str(e)[:200]
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, city, attempt, status, started_at, **tags)
+
+def render_prometheus():
+    """Текстовый формат Prometheus"""
+    lines = ["# HELP crm_stage_duration_seconds Duration of CRM monitor stages",
+             "# TYPE crm_stage_duration_seconds histogram"]
+    with _lock:
+        for (stage, city), h in sorted(_histograms.items()):
+            labels = f'stage="{stage}",city="{city}"'
+            for le, n in zip(BUCKETS, h["buckets"]):
+                lines.append(f'crm_stage_duration_seconds_bucket{{{labels},le="{le}"}} {n}')
+            lines.append(f'crm_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {h["buckets"][-1]}')
+            lines.append(f"crm_stage_duration_seconds_sum{{{labels}}} {h['sum']:.6f}")
+            lines.append(f"crm_stage_duration_seconds_count{{{labels}}} {h['count']}")
+        lines += ["# HELP crm_stage_errors_total Failed CRM monitor stages",
+                  "# TYPE crm_stage_errors_total counter"]
+        for (stage, city), n in sorted(_errors.items()):
+            lines.append(f'crm_stage_errors_total{{stage="{stage}",city="{city}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+async def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """HTTP /metrics для Prometheus (aiohttp); возвращает runner для остановки или None"""
+    if not port:
+        return None
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Metrics: http://{host}:{port}/metrics")
+    return runner
+
+def importtime_report(argv, top=15):
+    """
+    Запускает python -X importtime argv и печатает самые дорогие импорты верхнего уровня
+    (с учётом ленивых импортов по ходу запуска). Возвращает код выхода запуска.
+    """
+    import sys, subprocess
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            print(line, file=sys.stderr)
+            continue
+        # import time: self [us] | cumulative | imported package
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative, name = int(parts[1]), parts[2]
+        except (IndexError, ValueError):
+            continue   # строка заголовка
+        # вложенность — отступ имени по 2 пробела на уровень
+        if len(name) - len(name.lstrip()) <= 1:
+            rows.append((cumulative, name.strip()))
+    total = sum(c for c, _ in rows)
+    print(f"\n⏱️ Импорты: {len(rows)} модулей верхнего уровня, {total / 1000:.0f} ms "
+          f"(весь запуск {wall * 1000:.0f} ms)")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    return proc.returncode
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка CRM и Telegram Bot API для нагрузочных и регрессионных прогонов.
+
+CRM:
+    /login            — форма с теми же селекторами, что ищет ensure_dashboard (email, password, «Войти»)
+    /?city=<key>      — дашборд: календарь на 7 дней, карточки рисуются из XHR /api/calendar
+    /api/calendar     — {"days": [{"date": "YYYY-MM-DD", "unassigned": N}, ...]}
+Bot API:
+    /bot<token>/sendPhoto, /bot<token>/sendMessage — записываются, ответ как у Telegram
+    /_calls           — записанные вызовы (JSON), DELETE /_calls — очистить
+
+Запуск отдельно:
+    python mock_crm.py --port 8780 --latency-ms 150 --fail-rate 0.05 --badge-every 3
+    TELEGRAM_API_BASE=http://127.0.0.1:8780 ...
+"""
+
+import json, time, random, asyncio, argparse, datetime as dt
+from zoneinfo import ZoneInfo
+from aiohttp import web
+
+LOGIN_HTML = """<!doctype html><html><head><meta charset="utf-8"><title>Вход</title></head>
+<body style="font-family:sans-serif">
+<form method="post" action="/login" style="width:320px;margin:80px auto">
+  <input name="email" type="email" placeholder="Введите ваш e-mail" style="display:block;width:100%;margin:8px 0">
+  <input name="password" type="password" placeholder="Введите пароль" style="display:block;width:100%;margin:8px 0">
+  <button type="submit">Войти</button>
+</form></body></html>"""
+
+DASHBOARD_HTML = """<!doctype html><html><head><meta charset="utf-8"><title>Дашборд</title>
+<style>
+  body { font-family: sans-serif; margin: 16px; background: #f5f6f8; }
+  /* Геометрия как у настоящей CRM: карточка CARD_WIDTH=250 px (badge_presence), badge в правом верхнем углу */
+  .card { display: inline-block; position: relative; box-sizing: border-box; width: 250px; height: 110px;
+          margin: 6px; padding: 10px; background: #fff; border: 1px solid #dde; vertical-align: top; }
+  .date { font-size: 18px; font-weight: bold; }
+  .stat { font-size: 13px; color: #555; margin-top: 8px; }
+  .badge { position: absolute; top: 8px; right: 10px; min-width: 14px; padding: 2px 7px; border-radius: 12px;
+           background: rgb(229, 57, 53); color: #fff; font: bold 14px sans-serif; text-align: center; }
+</style></head>
+<body><h3>Ближайшие дни</h3><div id="calendar"></div>
+<script>
+fetch('/api/calendar' + location.search).then(r => r.json()).then(d => {
+  const root = document.getElementById('calendar');
+  for (const day of d.days) {
+    const [y, m, dd] = day.date.split('-');
+    const card = document.createElement('div');
+    card.className = 'card';
+    card.innerHTML = `<div class="date">${+dd}.${m}</div><div class="stat">Кол-во: ${day.total}</div>` +
+                     (day.unassigned ? `<span class="badge">${day.unassigned}</span>` : '');
+    root.appendChild(card);
+  }
+});
+</script></body></html>"""
+
+class MockCRM:
+    """
+    badges: {city_key: {смещение_дня: число}}; для городов без записи — badge_every:
+    каждый badge_every-й город (по номеру в ключе) получает badge на всех датах.
+    """
+
+    def __init__(self, badges=None, badge_every=0, latency_ms=0, jitter_ms=0, fail_rate=0.0,
+                 tg_429_rate=0.0, timezone="Europe/Warsaw", seed=None):
+        self.badges = badges or {}
+        self.badge_every = badge_every
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.tg_429_rate = tg_429_rate
+        self.tz = ZoneInfo(timezone)
+        self.rng = random.Random(seed)
+        self.calls = []
+        self.requests = 0
+        self.logins = 0
+
+    def city_badges(self, city):
+        if city in self.badges:
+            return self.badges[city]
+        digits = "".join(ch for ch in city if ch.isdigit())
+        if self.badge_every and digits and int(digits) % self.badge_every == 0:
+            return {i: 1 + int(digits) % 5 for i in range(7)}
+        return {}
+
+    def expected_alert(self, city):
+        return bool(self.city_badges(city))
+
+    def app(self):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/login", self.login_page)
+        app.router.add_post("/login", self.login_submit)
+        app.router.add_get("/", self.dashboard)
+        app.router.add_get("/api/calendar", self.calendar)
+        app.router.add_post("/bot{token}/{method}", self.bot_api)
+        app.router.add_get("/_calls", self.get_calls)
+        app.router.add_delete("/_calls", self.reset_calls)
+        return app
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        """Задержка и случайные 500 для страниц CRM (Bot API и /_calls не трогаем)"""
+        if request.path.startswith(("/bot", "/_calls")):
+            return await handler(request)
+        self.requests += 1
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep((self.latency_ms + self.rng.uniform(0, self.jitter_ms)) / 1000)
+        if self.fail_rate and self.rng.random() < self.fail_rate:
+            return web.Response(status=500, text="injected failure")
+        return await handler(request)
+
+    async def login_page(self, request):
+        return web.Response(text=LOGIN_HTML, content_type="text/html")
+
+    async def login_submit(self, request):
+        form = await request.post()
+        if not form.get("email") or not form.get("password"):
+            raise web.HTTPFound("/login")
+        self.logins += 1
+        res = web.HTTPFound("/")
+        res.set_cookie("session", f"s{self.logins}", httponly=True)
+        raise res
+
+    async def dashboard(self, request):
+        if "session" not in request.cookies:
+            raise web.HTTPFound("/login")
+        return web.Response(text=DASHBOARD_HTML, content_type="text/html")
+
+    async def calendar(self, request):
+        if "session" not in request.cookies:
+            return web.json_response({"error": "unauthorized"}, status=401)
+        badges = self.city_badges(request.query.get("city", ""))
+        today = dt.datetime.now(self.tz).date()
+        days = [{"date": (today + dt.timedelta(days=i)).isoformat(), "total": 100 + i,
+                 "unassigned": badges.get(i, 0)} for i in range(7)]
+        return web.json_response({"days": days})
+
+    async def bot_api(self, request):
+        method = request.match_info["method"]
+        form = await request.post()
+        if self.tg_429_rate and self.rng.random() < self.tg_429_rate:
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": 1}}, status=429)
+        photo = form.get("photo")
+        self.calls.append({"method": method, "chat_id": form.get("chat_id"), "caption": form.get("caption"),
+                           "upload": hasattr(photo, "file"), "ts": time.time()})
+        n = len(self.calls)
+        result = {"message_id": n, "chat": {"id": form.get("chat_id")}}
+        if method == "sendPhoto":
+            result["photo"] = [{"file_id": photo if isinstance(photo, str) else f"mock_file_{n}"}]
+        return web.json_response({"ok": True, "result": result})
+
+    async def get_calls(self, request):
+        return web.json_response(self.calls)
+
+    async def reset_calls(self, request):
+        self.calls.clear()
+        return web.json_response({"ok": True})
+
+async def start(mock, host="127.0.0.1", port=8780):
+    """Запускает заглушку в текущем event loop; возвращает runner (runner.cleanup() — остановить)"""
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8780)
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--jitter-ms", type=float, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="доля страниц CRM, отвечающих 500")
+    ap.add_argument("--tg-429-rate", type=float, default=0.0, help="доля вызовов Bot API, отвечающих 429")
+    ap.add_argument("--badge-every", type=int, default=3, help="badge у каждого N-го города (0 — ни у кого)")
+    ap.add_argument("--badges", help='JSON {"city": {"0": 2, "1": 1}} — badge по смещению дня')
+    args = ap.parse_args()
+    badges = {c: {int(k): v for k, v in d.items()} for c, d in json.loads(args.badges).items()} if args.badges else None
+    mock = MockCRM(badges, args.badge_every, args.latency_ms, args.jitter_ms, args.fail_rate, args.tg_429_rate)
+    print(f"🧪 Mock CRM: http://{args.host}:{args.port}/login  (Bot API: TELEGRAM_API_BASE=http://{args.host}:{args.port})")
+    web.run_app(mock.app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -3,191 +3,305 @@
 Мониторинг нескольких CRM систем одновременно
 """
 
-import os, asyncio, json, datetime as dt
+import os, sys, time, asyncio, struct, signal, argparse, contextlib, datetime as dt
 from pathlib import Path
-import cv2, requests
-from playwright.async_api import async_playwright
 from zoneinfo import ZoneInfo
 
-from badge_presence import find_date_bbox, target_date_str, detect_badge_presence, red_mask_union
+# Тяжёлые модули (playwright, cv2/numpy, OCR, aiohttp) импортируются в стадиях, которым они нужны:
+# запуск, в котором проверять нечего, не платит за их загрузку
 from multi_crm_config import CRM_CONFIGS, TELEGRAM_BOT_TOKEN
+from session_cache import SessionCache
+from ocr_executor import run_detection, shutdown_executor
+import artifacts
+from scheduler import next_run, in_notification_hours
+from dispatcher import Dispatcher
+from city_groups import group_key, build_groups
+import metrics
+import login_discovery
+from page_profile import PageProfile, merge_reports, save_sizes
+import calendar_clip
 
 ROOT = Path(__file__).parent
 ART = ROOT / "run_artifacts"
 ART.mkdir(exist_ok=True)
 
+# Сколько городов одновременно держат открытый контекст в общем браузере (по умолчанию — по числу ядер)
+MAX_CONTEXTS = int(os.getenv("CRM_MAX_CONTEXTS", str(max(2, os.cpu_count() or 2))))
+
+# Пауза, если готовность календаря не подтвердилась ни XHR, ни стабильным DOM
+FALLBACK_SETTLE_MS = int(os.getenv("CRM_FALLBACK_SETTLE_MS", "2000"))
+
+# "auto" — сначала DOM/XHR, OCR только если дата не нашлась; "ocr" — только скриншот+OCR
+DETECTION_MODE = os.getenv("CRM_DETECTION_MODE", "auto")
+
 class CRMMonitor:
-    def __init__(self, city_key, config):
+    def __init__(self, city_key, config, pool=None, telegram=None, group=None):
         self.city_key = city_key
         self.config = config
         self.name = config["name"]
+        self.pool = pool
+        self.telegram = telegram
+        self.sessions = SessionCache()
+        # Сессия общая для городов с одним хостом и логином (см. city_groups.py)
+        self.group = group
+        self.session_key = group.key if group is not None else group_key(config)
+        self.detection_mode = config.get("detection_mode", DETECTION_MODE)
+        self.dom_cells = None
+        self.date_counts = {}
+        self.detection_source = None
+        self.attempt = 0
+        self.traffic = None
+    
+    def span(self, stage, **tags):
+        """Замер стадии с тегами города и номера попытки (см. metrics.py)"""
+        return metrics.span(stage, city=self.city_key, attempt=self.attempt, **tags)
         
-    async def ensure_dashboard(self, page):
-        """Авторизация и переход на дашборд"""
-        print(f"[{self.name}] Current URL: {page.url}")
-        
-        if "login" in page.url:
+    async def login(self, page):
+        """Заполняет форму логина и ждёт ухода со страницы входа"""
+        with self.span("login"):
             print(f"[{self.name}] Login page detected, attempting authentication...")
-            
-            # Заполняем логин
-            login_filled = False
-            for sel in ['input[name="email"]','input[type="email"]','input[id*="email" i]','input[name*="login" i]']:
-                try: 
-                    await page.fill(sel, self.config["login"], timeout=1500)
-                    print(f"[{self.name}] Login filled with selector: {sel}")
-                    login_filled = True
-                    break
-                except Exception as e: 
-                    print(f"[{self.name}] Failed to fill login with {sel}: {e}")
-            
-            # Заполняем пароль
-            password_filled = False
-            for sel in ['input[name="password"]','input[type="password"]','input[id*="pass" i]']:
-                try: 
-                    await page.fill(sel, self.config["password"], timeout=1500)
-                    print(f"[{self.name}] Password filled with selector: {sel}")
-                    password_filled = True
-                    break
+        
+            # Все кандидаты сразу во всех фреймах; сработавший селектор запоминается для хоста
+            host = login_discovery.host_of(page.url)
+            filled = {}
+            for kind, value in (("email", self.config["login"]), ("password", self.config["password"])):
+                try:
+                    sel = await login_discovery.fill(page, kind, value, host)
+                    filled[kind] = sel is not None
+                    print(f"[{self.name}] {kind} filled with selector: {sel}")
                 except Exception as e:
-                    print(f"[{self.name}] Failed to fill password with {sel}: {e}")
-            
+                    print(f"[{self.name}] Failed to fill {kind}: {e}")
+            login_filled, password_filled = filled.get("email"), filled.get("password")
+        
             if not (login_filled and password_filled):
                 print(f"[{self.name}] WARNING: Failed to fill login/password fields")
-            
+        
             # Жмём кнопку входа
             login_clicked = False
-            selectors_to_try = [
-                'button:has-text("Войти")',
-                'button[type="submit"]', 
-                'text=/^Войти$/i',
-                'input[type="submit"]',
-                'button:has-text("Sign in")',
-                'button:has-text("Login")',
-                '[role="button"]:has-text("Войти")',
-                'form button'
-            ]
-            
-            for sel in selectors_to_try:
-                try: 
-                    await page.click(sel, timeout=1500)
-                    print(f"[{self.name}] Login button clicked with selector: {sel}")
-                    login_clicked = True
-                    await page.wait_for_timeout(2000)
-                    break
-                except Exception as e:
-                    print(f"[{self.name}] Failed to click login with {sel}: {e}")
-            
+            try:
+                sel = await login_discovery.click(page, "submit", host)
+                login_clicked = sel is not None
+                print(f"[{self.name}] Login button clicked with selector: {sel}")
+            except Exception as e:
+                print(f"[{self.name}] Failed to click login button: {e}")
+        
             if not login_clicked:
                 print(f"[{self.name}] WARNING: Failed to click login button - trying Enter key")
                 try:
                     await page.keyboard.press("Enter")
                     login_clicked = True
-                    await page.wait_for_timeout(2000)
                 except Exception as e:
                     print(f"[{self.name}] Enter key also failed: {e}")
-                
+            
             # Ждём редиректа после логина
             try:
                 await page.wait_for_url(lambda url: "login" not in url, timeout=30000)
                 print(f"[{self.name}] Login successful! Redirected to: {page.url}")
             except Exception as e:
                 print(f"[{self.name}] Login might have failed, still on login page: {e}")
-                await page.wait_for_load_state("networkidle", timeout=10000)
+                # Запомненный селектор мог быть чужой кнопкой — на следующем логине ищем заново
+                login_discovery.forget(host)
+                await page.wait_for_load_state("load", timeout=10000)
                 print(f"[{self.name}] After login URL: {page.url}")
+
+    async def ensure_dashboard(self, page, xhr=None):
+        """Авторизация и переход на дашборд"""
+        print(f"[{self.name}] Current URL: {page.url}")
+        
+        if "login" in page.url:
+            await self.login(page)
         
         # Переходим на дашборд только если не уже там
-        if page.url != self.config["crm_dashboard"]:
-            print(f"[{self.name}] Navigating to dashboard: {self.config['crm_dashboard']}")
-            try:
-                await page.goto(self.config["crm_dashboard"], wait_until="networkidle", timeout=35000)
-                print(f"[{self.name}] Dashboard loaded successfully: {page.url}")
-            except Exception as e:
-                print(f"[{self.name}] Failed to load dashboard with networkidle: {e}")
+        with self.span("navigate"):
+            if page.url != self.config["crm_dashboard"]:
+                print(f"[{self.name}] Navigating to dashboard: {self.config['crm_dashboard']}")
+                # networkidle на дашборде с поллингом висит до таймаута — готовность календаря ждём ниже по событиям
                 try:
-                    await page.goto(self.config["crm_dashboard"], wait_until="domcontentloaded", timeout=15000)
-                    print(f"[{self.name}] Dashboard loaded with domcontentloaded: {page.url}")
-                except Exception as e2:
-                    print(f"[{self.name}] Dashboard loading completely failed: {e2}")
-                    raise e2
-        else:
-            print(f"[{self.name}] Already on dashboard!")
+                    await page.goto(self.config["crm_dashboard"], wait_until="domcontentloaded", timeout=35000)
+                    print(f"[{self.name}] Dashboard loaded: {page.url}")
+                except Exception as e:
+                    print(f"[{self.name}] Dashboard loading failed: {e}")
+                    raise
+            else:
+                print(f"[{self.name}] Already on dashboard!")
         
         # Ждем загрузки календаря с датами на дашборде
-        print(f"[{self.name}] Waiting for calendar dates to load...")
-        try:
-            await page.evaluate("window.scrollTo(0, 0)")
-            await page.wait_for_timeout(2000)
-            await page.wait_for_selector('text=/\\d{1,2}\\.\\d{2}/', timeout=15000)
-            print(f"[{self.name}] Calendar dates found on page")
-            await page.wait_for_timeout(3000)
-        except Exception as e:
-            print(f"[{self.name}] Warning: Could not find calendar dates: {e}")
-            await page.wait_for_timeout(5000)
+        with self.span("calendar_wait"):
+            print(f"[{self.name}] Waiting for calendar dates to load...")
+            try:
+                await page.evaluate("window.scrollTo(0, 0)")
+                await page.wait_for_selector('text=/\\d{1,2}\\.\\d{2}/', timeout=15000)
+                # Запросы календаря завершились и даты/badge в DOM перестали меняться
+                from dom_badges import wait_calendar_ready
+                elapsed = await wait_calendar_ready(page, xhr)
+                print(f"[{self.name}] Calendar ready in {elapsed:.1f}s")
+            except Exception as e:
+                # Крайний случай: сигналов готовности нет — короткая фиксированная пауза
+                print(f"[{self.name}] Warning: calendar readiness not confirmed: {e}")
+                await page.wait_for_timeout(FALLBACK_SETTLE_MS)
 
     async def grab_screenshot(self):
-        """Делает скриншот CRM дашборда"""
+        """Делает скриншот CRM дашборда: PNG байты в памяти + путь артефакта"""
         ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
         out_png = ART / f"dash_{self.city_key}_{ts}.png"
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True, args=["--no-sandbox","--disable-dev-shm-usage"])
-            ctx = await browser.new_context(viewport={"width":1440,"height":900}, locale="ru-RU", timezone_id=self.config["timezone"])
-            page = await ctx.new_page()
-            try:
-                await page.goto(self.config["crm_url"], wait_until="domcontentloaded", timeout=30000)
-                await self.ensure_dashboard(page)
-                
-                # Делаем скриншот только календаря (без статистики внизу)
-                await page.screenshot(
-                    path=str(out_png), 
-                    full_page=False,
-                    clip={'x': 0, 'y': 0, 'width': 1440, 'height': 450}
-                )
-                print(f"[{self.name}] Screenshot saved: {out_png}")
-            finally:
-                await ctx.close()
-                await browser.close()
-        return str(out_png)
+        if self.pool is None:
+            # Запуск вне monitor_all_cities — свой пул на один скриншот
+            from browser_pool import BrowserPool
+            async with BrowserPool(max_contexts=1) as pool:
+                png = await self._capture(pool)
+        else:
+            png = await self._capture(self.pool)
+        # На диск — только как артефакт и в фоне; одинаковые кадры хранятся один раз
+        artifacts.save_async(out_png, png, dedup=True)
+        return png, str(out_png)
 
-    def check_badge_presence(self, png_path):
-        """Проверяет наличие неразобранных заказов"""
-        img = cv2.imread(png_path)
-        if img is None: 
-            raise RuntimeError(f"PNG not read: {png_path}")
-        
-        # Определяем какую дату проверять в зависимости от времени
-        city_time = dt.datetime.now(ZoneInfo(self.config["timezone"]))
-        current_hour = city_time.hour
-        current_time = city_time.strftime("%H:%M")
-        
+    async def open_session(self, ctx, state):
+        """Открывает страницу: с сохранённой сессией сразу дашборд, иначе форма логина"""
+        page = await ctx.new_page()
+        if state:
+            # Дешёвая проверка сессии: если куки живы, CRM не отправит на /login
+            await page.goto(self.config["crm_dashboard"], wait_until="domcontentloaded", timeout=30000)
+            if "login" not in page.url:
+                print(f"[{self.name}] Reused saved session")
+                return page, True
+            print(f"[{self.name}] Saved session expired, logging in again")
+            self.sessions.invalidate(self.session_key)
+            return page, False
+        await page.goto(self.config["crm_url"], wait_until="domcontentloaded", timeout=30000)
+        return page, False
+
+    async def _capture(self, pool):
+        """Скриншот + DOM; в группе — один логин и одна загрузка одинакового дашборда на всех"""
+        if self.group is None:
+            png, self.dom_cells, self.traffic = await self._capture_page(pool)
+            return png
+        return await self._shared_capture(pool)
+
+    async def _shared_capture(self, pool):
+        offset = dt.datetime.now(ZoneInfo(self.config["timezone"])).utcoffset()
+        page_key = (self.config["crm_dashboard"], offset, self.detection_mode)
+        (png, cells, traffic), shared = await self.group.capture(page_key, lambda: self._capture_page(pool))
+        self.dom_cells = cells
+        # Трафик считаем один раз — у того, кто грузил страницу
+        self.traffic = None if shared else traffic
+        if shared:
+            print(f"[{self.name}] Reused dashboard capture of the login group ({len(png)} bytes)")
+        return png
+
+    async def _save_session(self, ctx):
+        try:
+            await self.sessions.save(self.session_key, ctx)
+            return True
+        except Exception as e:
+            print(f"[{self.name}] WARN: failed to save session: {e}")
+            return False
+
+    async def _capture_page(self, pool):
+        """Открывает дашборд в своём контексте; (png, dom_cells, traffic)"""
+        state = self.sessions.load(self.session_key)
+        stamp = self.sessions.stamp(self.session_key)
+        dom_cells = None
+        from dom_badges import XhrRecorder, read_date_cells
+        profile = PageProfile(self.config)
+        t0 = time.perf_counter()
+        async with pool.context(viewport={"width":1440,"height":900}, locale="ru-RU", timezone_id=self.config["timezone"], storage_state=state,
+                                **profile.context_options()) as ctx:
+            # Ожидание слота в пуле + (пере)запуск браузера + новый контекст
+            metrics.record("context", time.perf_counter() - t0, self.city_key, self.attempt)
+            # Без медиа/сторонних доменов и без анимаций
+            await profile.apply(ctx)
+            # Рекордер нужен и для готовности календаря, даже когда детекция только по OCR
+            xhr = XhrRecorder(ctx, self.config.get("calendar_xhr_pattern"))
+            # Проверка сессии и перелогин — под lock группы: с истёкшей общей сессией логинится один город,
+            # остальные ждут и берут уже обновлённую
+            async with self.group.lock if self.group is not None else contextlib.nullcontext():
+                saved = self.sessions.stamp(self.session_key)
+                if saved and saved != stamp:
+                    # Пока ждали lock, другой город группы перелогинился — берём его куки
+                    state = self.sessions.load(self.session_key)
+                    if state:
+                        await ctx.add_cookies(self.sessions.cookies(self.session_key))
+                with self.span("session", reused=bool(state)):
+                    page, reused = await self.open_session(ctx, state)
+                just_saved = False
+                if "login" in page.url:
+                    await self.login(page)
+                    if "login" not in page.url:
+                        just_saved = await self._save_session(ctx)
+            await self.ensure_dashboard(page, xhr)
+            # Сохраняем и после успешного повторного использования: обновлённые куки не теряются,
+            # а возраст файла считается от последней рабочей проверки
+            if not just_saved and "login" not in page.url:
+                await self._save_session(ctx)
+            
+            if self.detection_mode != "ocr":
+                try:
+                    with self.span("dom_read"):
+                        dom_cells = await read_date_cells(page, xhr)
+                    print(f"[{self.name}] DOM date cells: {len(dom_cells)}")
+                except Exception as e:
+                    print(f"[{self.name}] DOM detection unavailable, will use OCR: {e}")
+                    dom_cells = None
+            
+            # Скриншот только календаря (или карточки целевой даты): рамка из DOM, кеша города или конфига
+            card = self.config.get("clip", calendar_clip.CLIP_MODE) == "card"
+            clip, clip_source = await calendar_clip.find_clip(page, self.city_key, self.config, dom_cells,
+                                                              self.target_date() if card else None)
+            with self.span("screenshot", clip=clip_source):
+                png = await calendar_clip.screenshot(page, clip)
+            print(f"[{self.name}] Screenshot taken: {len(png)} bytes, {clip[2]}x{clip[3]} at ({clip[0]}, {clip[1]}) "
+                  f"[{clip_source}]")
+            if dom_cells:
+                # Рамки DOM — в координатах страницы, детекции нужны координаты скриншота
+                dom_cells = calendar_clip.shift_cells(dom_cells, -clip[0], -clip[1])
+            traffic = profile.report()
+            print(f"[{self.name}] Traffic: {traffic['loaded']} requests / {traffic['loaded_kb']} KB loaded, "
+                  f"{traffic['blocked']} blocked")
+        return png, dom_cells, traffic
+
+    def target_date(self):
+        """Какую дату проверять в зависимости от времени города ("D.MM")"""
+        from badge_presence import target_date_str
         # До 12:00 проверяем СЕГОДНЯ, после 12:00 проверяем ЗАВТРА
-        if current_hour < 12:  # Утренняя проверка - сегодня
-            date_text = target_date_str("today", self.config["timezone"])
-        else:  # Вечерняя/дневная проверка - завтра
-            date_text = target_date_str("tomorrow", self.config["timezone"])
+        if dt.datetime.now(ZoneInfo(self.config["timezone"])).hour < 12:  # Утренняя проверка - сегодня
+            return target_date_str("today", self.config["timezone"])
+        return target_date_str("tomorrow", self.config["timezone"])  # Вечерняя/дневная проверка - завтра
+
+    async def check_badge_presence(self, png, png_path):
+        """Проверяет наличие неразобранных заказов"""
+        from detection import analyze_screenshot
+        date_text = self.target_date()
         
-        date_box = find_date_bbox(img, date_text)
-        present, roi, dbg, red_ratio = detect_badge_presence(img, date_box, debug=True)
+        # Тяжёлая часть (декодирование, OCR, маски) — в пуле процессов, чтобы не блокировать event loop
+        with self.span("detection") as tags:
+            present, counts, debug_images, source = await run_detection(analyze_screenshot, png, date_text, self.city_key, self.name,
+                                                                self.config["timezone"], self.dom_cells, artifacts.SAVE_ARTIFACTS)
+            tags["source"] = source
+        if source == "ocr" and date_text not in counts:
+            # Дата не нашлась на кадре — возможно, календарь сдвинулся: рамку пересчитаем по DOM
+            calendar_clip.ClipCache().invalidate(self.city_key)
+        for suffix, data in debug_images.items():
+            artifacts.save_async(png_path.replace(".png", f"_{self.city_key}_{suffix}"), data)
         
-        # Сохраняем отладочные изображения
-        if roi:
-            rx,ry,rw,rh = roi
-            cv2.imwrite(png_path.replace(".png", f"_{self.city_key}_mask.png"), red_mask_union(img[ry:ry+rh, rx:rx+rw]))
-        if dbg is not None:
-            cv2.imwrite(png_path.replace(".png", f"_{self.city_key}_dbg.png"), dbg)
+        # Неразобранные заказы по всем видимым датам (None — badge есть, число не прочиталось)
+        self.date_counts = counts
+        self.detection_source = source
+        print(f"[{self.name}] Counts by date: {self.date_counts} (source: {source})")
         
         return present, date_text, png_path
 
-    def resize_for_telegram(self, image_path):
-        """Изменяет размер изображения для Telegram"""
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Cannot read image: {image_path}")
-        
-        h, w = img.shape[:2]
+    def resize_for_telegram(self, png):
+        """Изменяет размер изображения для Telegram (PNG байты -> PNG байты)"""
+        # Размер берём из заголовка PNG (IHDR), без декодирования
+        w, h = struct.unpack(">II", png[16:24])
         max_dimension = 2560
         
         if max(h, w) > max_dimension:
+            import cv2, numpy as np
+            img = cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                raise ValueError("Cannot decode screenshot")
             if h > w:
                 new_h = max_dimension
                 new_w = int(w * (max_dimension / h))
@@ -196,33 +310,31 @@ class CRMMonitor:
                 new_h = int(h * (max_dimension / w))
             
             img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            resized_path = image_path.replace('.png', '_resized.png')
-            cv2.imwrite(resized_path, img)
             print(f"[{self.name}] Image resized from {w}x{h} to {new_w}x{new_h}")
-            return resized_path
+            return cv2.imencode(".png", img)[1].tobytes()
         
-        return image_path
+        return png
 
-    def send_photo_with_caption(self, image_path, caption):
-        """Отправляет фото с подписью в Telegram"""
+    async def send_photo_with_caption(self, png, caption):
+        """Отправляет фото с подписью в Telegram (во все чаты из telegram_chat_id, через запятую)"""
         if not TELEGRAM_BOT_TOKEN:
             print(f"[{self.name}] WARN: no TELEGRAM_BOT_TOKEN — skip")
             return False
         
+        from telegram_client import TelegramSender, parse_chat_ids
         try:
-            resized_path = self.resize_for_telegram(image_path)
+            photo = self.resize_for_telegram(png)
+            chat_ids = parse_chat_ids(self.config["telegram_chat_id"])
             
-            with open(resized_path, "rb") as f:
-                r = requests.post(
-                    f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
-                    data={"chat_id": self.config["telegram_chat_id"], "caption": caption},
-                    files={"photo": f},
-                    timeout=30,
-                )
+            if self.telegram is None:
+                async with TelegramSender(TELEGRAM_BOT_TOKEN) as tg:
+                    sent = await tg.send_photo_to_chats(chat_ids, photo, caption)
+            else:
+                sent = await self.telegram.send_photo_to_chats(chat_ids, photo, caption)
             
-            ok = r.ok and r.json().get("ok", False)
+            ok = bool(sent) and all(sent.values())
             if not ok: 
-                print(f"[{self.name}] Telegram error:", r.text)
+                print(f"[{self.name}] Telegram error: {sent}")
             else:
                 print(f"[{self.name}] Successfully sent photo to Telegram")
                 
@@ -232,7 +344,7 @@ class CRMMonitor:
             print(f"[{self.name}] Error sending photo: {e}")
             return False
 
-    def send_status_message(self, date_text, has_issues, png_path=None):
+    async def send_status_message(self, date_text, has_issues, png=None):
         """Отправляет сообщение только при наличии проблем в определенные часы"""
         # Используем время соответствующего города
         city_time = dt.datetime.now(ZoneInfo(self.config["timezone"]))
@@ -243,9 +355,9 @@ class CRMMonitor:
             # Отправляем уведомление о проблемах только в рабочие часы
             if current_hour in self.config["notification_hours"]:
                 # Проверяем, не отправляли ли уже в этот час про эту дату
-                status_file = ART / f"last_alert_{self.city_key}_{date_text}_{current_hour}.txt"
-                if not status_file.exists():
-                    status_file.touch()
+                alerts = artifacts.alerts()
+                if not alerts.sent(self.city_key, date_text, current_hour):
+                    alerts.mark(self.city_key, date_text, current_hour)
                     # Формируем текст в зависимости от времени проверки
                     if current_hour == 7:
                         day_label = "на сегодня"
@@ -254,8 +366,9 @@ class CRMMonitor:
                     else:
                         day_label = f"на {date_text}"
                     caption = f"⚠️ {day_label.capitalize()} есть неразобранные заказы. Проверьте CRM ({self.name})"
-                    if png_path:
-                        result = self.send_photo_with_caption(png_path, caption)
+                    if png:
+                        with self.span("telegram"):
+                            result = await self.send_photo_with_caption(png, caption)
                         if result:
                             print(f"[{self.name}] Sent alert at {current_time} for {date_text}")
                         return result
@@ -274,17 +387,20 @@ class CRMMonitor:
         
         # Повторные попытки при сетевых ошибках
         for attempt in range(1, max_retries + 1):
+            self.attempt = attempt
             try:
                 if attempt > 1:
                     # Задержка перед повторной попыткой (10, 20, 30 секунд)
                     wait_time = attempt * 10
                     print(f"[{self.name}] Попытка {attempt}/{max_retries} через {wait_time} секунд...")
-                    await asyncio.sleep(wait_time)
+                    with self.span("retry_backoff"):
+                        await asyncio.sleep(wait_time)
                 else:
                     print(f"\n🏙️ === Мониторинг {self.name} ===")
                 
-                png = await self.grab_screenshot()
-                present, date_text, png_path = self.check_badge_presence(png)
+                with self.span("capture"):
+                    png, png_path = await self.grab_screenshot()
+                present, date_text, png_path = await self.check_badge_presence(png, png_path)
                 
                 # Если проверка пропущена (не в часы уведомлений)
                 if present is None and date_text is None:
@@ -297,13 +413,16 @@ class CRMMonitor:
                     print(f"[{self.name}] RESULT: {result}")
                     return result
                 
-                sent = self.send_status_message(date_text, present, png_path)
+                sent = await self.send_status_message(date_text, present, png)
                 
                 result = {
                     "city": self.name,
                     "present": present, 
                     "sent": sent, 
                     "date": date_text, 
+                    "counts": self.date_counts,
+                    "source": self.detection_source,
+                    "traffic": self.traffic,
                     "png": png_path
                 }
                 
@@ -331,39 +450,149 @@ class CRMMonitor:
         
         return {"city": self.name, "error": str(last_error)}
 
-async def monitor_all_cities():
-    """Мониторинг всех настроенных городов"""
-    print("🚀 Запуск мониторинга всех CRM систем...")
-    
-    tasks = []
+def active_configs():
+    """Включённые города из CRM_CONFIGS"""
+    active = []
     for city_key, config in CRM_CONFIGS.items():
         if config.get("enabled", True):
-            monitor = CRMMonitor(city_key, config)
-            tasks.append(monitor.monitor())
+            active.append((city_key, config))
         else:
             print(f"⏸️ {config['name']} отключен")
+    return active
+
+def print_summary(results):
+    print("\n📊 === ОБЩИЕ РЕЗУЛЬТАТЫ ===")
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"❌ Ошибка: {result}")
+        else:
+            city = result.get("city", "Unknown")
+            if "error" in result:
+                print(f"❌ {city}: {result['error']}")
+            elif result.get("skipped"):
+                print(f"⏸️ {city}: Пропущено - {result.get('reason', 'Unknown reason')}")
+            else:
+                status = "🚨 ПРОБЛЕМЫ" if result["present"] else "✅ ВСЕ ОК"
+                sent_status = "📤 ОТПРАВЛЕНО" if result["sent"] else "📭 НЕ ОТПРАВЛЕНО"
+                print(f"{status} {city} ({result['date']}): {sent_status}")
+    
+    over_budget = [r["city"] for r in results if isinstance(r, dict) and r.get("reason") == "Run budget exhausted"]
+    if over_budget:
+        print(f"⏭️ Не успели в бюджет запуска ({len(over_budget)}): {', '.join(over_budget)} — в следующий раз пойдут первыми")
+    
+    traffic = [r["traffic"] for r in results if isinstance(r, dict) and r.get("traffic")]
+    if traffic:
+        t = merge_reports(traffic)
+        print(f"🌐 Трафик: загружено {t['loaded']} запросов / {t['loaded_kb']} KB; "
+              f"заблокировано {t['blocked']} {t['blocked_by_type']} — сэкономлено ≈{t['saved_kb']} KB "
+              f"(размер неизвестен для {t['blocked_unknown_size']}); домены: {t['blocked_hosts']}")
+
+def plan_run(force=False):
+    """
+    Pre-flight по конфигу и часам городов (без браузера и OCR): (города к проверке, пропущенные).
+    Вне notification_hours одиночный запуск ничего не отправит — такие города не проверяем.
+    """
+    due, skipped = [], []
+    for city_key, config in active_configs():
+        if force or in_notification_hours(config):
+            due.append((city_key, config))
+        else:
+            skipped.append({"city": config["name"], "skipped": True, "reason": "Not in notification hours"})
+    return due, skipped
+
+async def monitor_all_cities(force=False):
+    """Мониторинг всех настроенных городов"""
+    print("🚀 Запуск мониторинга всех CRM систем...")
     
-    if tasks:
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    active, skipped = plan_run(force)
+    if active:
+        from browser_pool import BrowserPool
+        from telegram_client import TelegramSender
+        # Один браузер на весь запуск, у каждого города свой контекст
+        async with BrowserPool(max_contexts=MAX_CONTEXTS) as pool, TelegramSender(TELEGRAM_BOT_TOKEN) as telegram:
+            # Общий лимит + лимит на хост CRM, дедлайн на город и бюджет на весь запуск
+            groups = build_groups(active)
+            monitors = [CRMMonitor(city_key, config, pool, telegram, groups[city_key]) for city_key, config in active]
+            try:
+                results = await Dispatcher(MAX_CONTEXTS).run(monitors)
+            finally:
+                shutdown_executor()
+                await artifacts.flush()
+                await asyncio.to_thread(artifacts.prune)
+                save_sizes()
         
-        print("\n📊 === ОБЩИЕ РЕЗУЛЬТАТЫ ===")
-        for result in results:
-            if isinstance(result, Exception):
-                print(f"❌ Ошибка: {result}")
-            else:
-                city = result.get("city", "Unknown")
-                if "error" in result:
-                    print(f"❌ {city}: {result['error']}")
-                elif result.get("skipped"):
-                    print(f"⏸️ {city}: Пропущено - {result.get('reason', 'Unknown reason')}")
-                else:
-                    status = "🚨 ПРОБЛЕМЫ" if result["present"] else "✅ ВСЕ ОК"
-                    sent_status = "📤 ОТПРАВЛЕНО" if result["sent"] else "📭 НЕ ОТПРАВЛЕНО"
-                    print(f"{status} {city} ({result['date']}): {sent_status}")
+        print_summary(results + skipped)
+    elif skipped:
+        print(f"💤 Сейчас не час уведомлений ни для одного из {len(skipped)} городов — проверять нечего "
+              f"(--force — проверить всё равно)")
     else:
         print("⚠️ Нет активных конфигураций для мониторинга")
 
-if __name__ == "__main__":
-    asyncio.run(monitor_all_cities())
+async def city_loop(monitor):
+    """Бесконечный цикл проверок одного города по его расписанию"""
+    while True:
+        run_at = next_run(monitor.config)
+        if run_at is None:
+            print(f"[{monitor.name}] No schedule (empty notification_hours and no poll_interval_minutes) — stopping")
+            return
+        local = run_at.astimezone(ZoneInfo(monitor.config["timezone"]))
+        print(f"[{monitor.name}] Next check at {local:%Y-%m-%d %H:%M:%S %Z}")
+        await asyncio.sleep(max(0.0, (run_at - dt.datetime.now(dt.timezone.utc)).total_seconds()))
+        try:
+            print_summary([await monitor.monitor()])
+        except Exception as e:
+            print(f"[{monitor.name}] ERROR in scheduled check: {e}")
+        await artifacts.flush()
+        await asyncio.to_thread(artifacts.prune)
+        save_sizes()
 
+async def run_daemon():
+    """Режим демона: браузер, сессии, Telegram-сессия и OCR-пул живут между проверками"""
+    print("🛰️ Запуск мониторинга в режиме демона...")
+    active = []
+    for city_key, config in active_configs():
+        # Город без расписания не запускаем: его цикл сразу бы завершился
+        if next_run(config, jitter=0) is None:
+            print(f"[{config['name']}] No schedule (empty notification_hours and no poll_interval_minutes) — skipped")
+        else:
+            active.append((city_key, config))
+    if not active:
+        print("⚠️ Нет активных конфигураций для мониторинга")
+        return
+    
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    from browser_pool import BrowserPool
+    from telegram_client import TelegramSender
+    metrics_runner = await metrics.start_metrics_server()
+    async with BrowserPool(max_contexts=MAX_CONTEXTS) as pool, TelegramSender(TELEGRAM_BOT_TOKEN) as telegram:
+        groups = build_groups(active)
+        tasks = [asyncio.create_task(city_loop(CRMMonitor(city_key, config, pool, telegram, groups[city_key])))
+                 for city_key, config in active]
+        stopper = asyncio.create_task(stop.wait())
+        try:
+            # Города без расписания выходят из своего цикла сами; демон работает до сигнала
+            await stopper
+        finally:
+            for t in [stopper, *tasks]:
+                t.cancel()
+            await asyncio.gather(stopper, *tasks, return_exceptions=True)
+            shutdown_executor()
+            await artifacts.flush()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            print("🛑 Демон остановлен")
 
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--daemon", action="store_true", help="работать постоянно и проверять по расписанию городов")
+    ap.add_argument("--force", action="store_true", help="проверить все включённые города, даже вне notification_hours")
+    ap.add_argument("--import-report", action="store_true",
+                    help="запустить под python -X importtime и показать самые дорогие импорты")
+    args = ap.parse_args()
+    if args.import_report:
+        sys.exit(metrics.importtime_report([__file__] + [a for a in sys.argv[1:] if a != "--import-report"]))
+    asyncio.run(run_daemon() if args.daemon else monitor_all_cities(args.force))
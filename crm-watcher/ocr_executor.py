@@ -0,0 +1,46 @@
+"""
+Пул процессов для CPU-тяжёлой детекции (OpenCV + EasyOCR), чтобы не блокировать asyncio loop
+"""
+
+import os, asyncio, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 0 — выполнять в потоке текущего процесса (без отдельной копии модели в памяти)
+OCR_PROCESSES = int(os.getenv("CRM_OCR_PROCESSES", "1"))
+# Потоков torch/OpenMP (и onnxruntime intra-op) на один процесс пула; по умолчанию ядра делятся поровну
+OCR_TORCH_THREADS = int(os.getenv("CRM_OCR_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, OCR_PROCESSES)))))
+
+_executor = None
+
+def _init_worker(threads):
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import cv2
+    cv2.setNumThreads(threads)
+    # с ONNX бэкендом torch не нужен — не импортируем его ради одной настройки
+    if os.getenv("CRM_OCR_BACKEND", "easyocr").split("+")[-1] == "onnx":
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def get_executor():
+    global _executor
+    if _executor is None and OCR_PROCESSES > 0:
+        # spawn: не форкаем процесс с уже запущенными потоками Playwright/asyncio
+        _executor = ProcessPoolExecutor(max_workers=OCR_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(OCR_TORCH_THREADS,))
+    return _executor
+
+async def run_detection(fn, *args):
+    """Выполняет fn(*args) в пуле процессов (или в потоке, если CRM_OCR_PROCESSES=0)"""
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
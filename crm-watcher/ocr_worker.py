@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Долгоживущий OCR воркер: держит EasyOCR модель прогретой и отвечает по Unix-сокету.
+
+Запуск:  python ocr_worker.py            (сокет: $CRM_OCR_SOCKET или crm-watcher/ocr_worker.sock)
+Клиент:  badge_presence.get_reader() сам подключается к сокету, если он есть,
+         иначе создаёт EasyOCR в своём процессе.
+
+Протокол (один запрос на соединение):
+  -> [4 байта длина][JSON {"op": "readtext"|"recognize", "kwargs": {...}}][4 байта длина][PNG]
+  <- [4 байта длина][JSON {"ok": true, "result": [...]} | {"ok": false, "error": "..."}]
+"""
+
+import os, json, socket, struct, socketserver, argparse
+from pathlib import Path
+import cv2, numpy as np
+
+ROOT = Path(__file__).parent
+SOCKET_PATH = os.getenv("CRM_OCR_SOCKET", str(ROOT / "ocr_worker.sock"))
+OPS = ("readtext", "recognize")
+
+def _send(sock, data):
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+def _recv(sock):
+    head = _recv_exact(sock, 4)
+    return _recv_exact(sock, struct.unpack("!I", head)[0])
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("OCR worker connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def _to_json(results):
+    """Результаты EasyOCR (numpy внутри) -> обычные списки"""
+    out = []
+    for box, text, conf in results:
+        out.append([[[float(p[0]), float(p[1])] for p in box], str(text), float(conf)])
+    return out
+
+class RemoteReader:
+    """Клиент воркера с интерфейсом easyocr.Reader (readtext/recognize)"""
+
+    def __init__(self, path=SOCKET_PATH, timeout=60, fallback=None):
+        self.path = path
+        self.timeout = timeout
+        self.fallback = fallback
+        self._local = None
+
+    def _call(self, op, img, kwargs):
+        if self._local is None:
+            try:
+                return self._remote(op, img, kwargs)
+            except (OSError, ConnectionError) as e:
+                if self.fallback is None:
+                    raise
+                print(f"WARN: OCR worker unavailable ({e}) — falling back to in-process EasyOCR")
+                self._local = self.fallback()
+        return getattr(self._local, op)(img, **kwargs)
+
+    def _remote(self, op, img, kwargs):
+        ok, png = cv2.imencode(".png", img)
+        if not ok:
+            raise ValueError("cannot encode image for OCR worker")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(self.timeout)
+            s.connect(self.path)
+            _send(s, json.dumps({"op": op, "kwargs": kwargs}).encode())
+            _send(s, png.tobytes())
+            resp = json.loads(_recv(s))
+        if not resp.get("ok"):
+            raise RuntimeError(f"OCR worker error: {resp.get('error')}")
+        result = resp["result"]
+        return [r[1] for r in result] if kwargs.get("detail", 1) == 0 else [tuple(r) for r in result]
+
+    def readtext(self, img, **kwargs):
+        return self._call("readtext", img, kwargs)
+
+    def recognize(self, img, **kwargs):
+        return self._call("recognize", img, kwargs)
+
+def worker_available(path=SOCKET_PATH):
+    if not os.path.exists(path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(1)
+            s.connect(path)
+        return True
+    except OSError:
+        return False
+
+class OCRHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            req = json.loads(_recv(self.request))
+            img = cv2.imdecode(np.frombuffer(_recv(self.request), np.uint8), cv2.IMREAD_UNCHANGED)
+            if req.get("op") not in OPS or img is None:
+                raise ValueError(f"bad request: op={req.get('op')}")
+            kwargs = dict(req.get("kwargs") or {})
+            kwargs["detail"] = 1
+            res = getattr(self.server.reader, req["op"])(img, **kwargs)
+            _send(self.request, json.dumps({"ok": True, "result": _to_json(res)}).encode())
+        except Exception as e:
+            try:
+                _send(self.request, json.dumps({"ok": False, "error": str(e)}).encode())
+            except OSError:
+                pass
+
+def serve(path=SOCKET_PATH):
+    from badge_presence import _local_reader
+    if os.path.exists(path):
+        if worker_available(path):
+            raise SystemExit(f"OCR worker already running at {path}")
+        os.unlink(path)
+    reader = _local_reader()
+    # Запросы обрабатываются по одному: Reader не потокобезопасен
+    with socketserver.UnixStreamServer(path, OCRHandler) as server:
+        os.chmod(path, 0o600)
+        server.reader = reader
+        print(f"🔤 OCR worker ready: {path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    serve(ap.parse_args().socket)
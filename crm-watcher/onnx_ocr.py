@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+OCR без PyTorch: те же модели EasyOCR (детектор CRAFT + распознаватель CRNN), экспортированные в ONNX
+(при желании — с int8 квантованием весов) и запущенные через onnxruntime на CPU.
+
+Интерфейс как у easyocr.Reader (readtext / recognize), подключается через get_reader()
+при CRM_OCR_BACKEND=onnx (или digits+onnx — шаблонные цифры, ONNX только при сомнениях).
+
+Экспорт делается один раз там, где стоят easyocr и torch (можно на ноутбуке), папку моделей
+потом копируем на сервер, где нужен только onnxruntime:
+    python onnx_ocr.py --export --quantize        # -> onnx_models/{detector,recognizer}[_int8].onnx, meta.json
+    python onnx_ocr.py --image run_artifacts/dash_warsaw_....png
+"""
+
+import os, json, math, time, argparse
+from pathlib import Path
+import cv2, numpy as np
+
+ROOT = Path(__file__).parent
+MODELS_DIR = Path(os.getenv("CRM_ONNX_DIR", str(ROOT / "onnx_models")))
+# Потоков внутри одного оператора; по умолчанию — как у torch в пуле OCR (ядра делятся между процессами)
+THREADS = int(os.getenv("CRM_ONNX_THREADS", "0")) or None
+# 1 — брать *_int8.onnx, если они есть
+QUANTIZED = os.getenv("CRM_ONNX_QUANTIZED", "1") == "1"
+
+# Параметры как у easyocr.Reader.readtext по умолчанию
+CANVAS_SIZE = 2560
+TEXT_THRESHOLD, LINK_THRESHOLD, LOW_TEXT = 0.7, 0.4, 0.4
+MIN_SIZE = 20
+ADD_MARGIN = 0.1
+HEIGHT_THS, WIDTH_THS, YCENTER_THS = 0.5, 0.5, 0.5
+MEAN = np.array([0.485, 0.456, 0.406], np.float32) * 255
+STD = np.array([0.229, 0.224, 0.225], np.float32) * 255
+
+def model_path(name, directory=MODELS_DIR):
+    int8 = Path(directory) / f"{name}_int8.onnx"
+    return int8 if QUANTIZED and int8.exists() else Path(directory) / f"{name}.onnx"
+
+def models_available(directory=MODELS_DIR):
+    return (Path(directory) / "meta.json").exists() and all(model_path(n, directory).exists()
+                                                            for n in ("detector", "recognizer"))
+
+def _session(path, threads):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # на маленьком VPS потоки не крутятся вхолостую между вызовами (делим CPU с Chromium)
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+def _default_threads():
+    from ocr_executor import OCR_TORCH_THREADS
+    return OCR_TORCH_THREADS
+
+# ---- детектор ----
+
+def _resize_for_detector(img):
+    """Как craft resize_aspect_ratio: длинная сторона <= CANVAS_SIZE, стороны кратны 32"""
+    h, w = img.shape[:2]
+    ratio = min(1.0, CANVAS_SIZE / max(h, w))
+    th, tw = int(h * ratio), int(w * ratio)
+    resized = cv2.resize(img, (tw, th), interpolation=cv2.INTER_LINEAR)
+    canvas = np.zeros((th + (-th) % 32, tw + (-tw) % 32, 3), np.float32)
+    canvas[:th, :tw] = resized
+    return canvas, ratio
+
+def detection_boxes(textmap, linkmap, scale):
+    """
+    Упрощённый craft getDetBoxes для горизонтального текста: компоненты карты текста+связей
+    -> [x1, x2, y1, y2] в координатах исходной картинки (scale — пикселей картинки на пиксель карты)
+    """
+    text_score = (textmap > LOW_TEXT).astype(np.uint8)
+    link_score = (linkmap > LINK_THRESHOLD).astype(np.uint8)
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(np.clip(text_score + link_score, 0, 1), connectivity=4)
+    boxes = []
+    for k in range(1, n):
+        x, y, w, h, size = stats[k]
+        if size < 10:
+            continue
+        comp = labels == k
+        if textmap[comp].max() < TEXT_THRESHOLD:
+            continue
+        # как в CRAFT: расширяем компоненту пропорционально её толщине
+        niter = int(math.sqrt(size * min(w, h) / (w * h)) * 2)
+        x1, y1 = max(0, x - niter), max(0, y - niter)
+        x2, y2 = min(textmap.shape[1], x + w + niter + 1), min(textmap.shape[0], y + h + niter + 1)
+        boxes.append([x1 * scale, x2 * scale, y1 * scale, y2 * scale])
+    return boxes
+
+def group_boxes(boxes):
+    """Как easyocr group_text_box для горизонтальных рамок: слова одной строки с малым зазором -> одна рамка"""
+    boxes = sorted(boxes, key=lambda b: (b[2] + b[3]) / 2)
+    lines = []
+    for b in boxes:
+        h, yc = b[3] - b[2], (b[2] + b[3]) / 2
+        for line in lines:
+            lh = np.mean([r[3] - r[2] for r in line])
+            lyc = np.mean([(r[2] + r[3]) / 2 for r in line])
+            if abs(lh - h) < HEIGHT_THS * lh and abs(lyc - yc) < YCENTER_THS * lh:
+                line.append(b)
+                break
+        else:
+            lines.append([b])
+    merged = []
+    for line in lines:
+        line.sort(key=lambda r: r[0])
+        cur = list(line[0])
+        for r in line[1:]:
+            h = max(cur[3] - cur[2], r[3] - r[2])
+            if r[0] - cur[1] < WIDTH_THS * h:
+                cur = [cur[0], max(cur[1], r[1]), min(cur[2], r[2]), max(cur[3], r[3])]
+            else:
+                merged.append(cur)
+                cur = list(r)
+        merged.append(cur)
+    out = []
+    for x1, x2, y1, y2 in merged:
+        margin = int(ADD_MARGIN * (y2 - y1))
+        box = [int(x1) - margin, int(x2) + margin, int(y1) - margin, int(y2) + margin]
+        if max(box[1] - box[0], box[3] - box[2]) >= MIN_SIZE:
+            out.append(box)
+    return out
+
+# ---- распознаватель ----
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+def ctc_decode(logits, characters, allowlist=None):
+    """Жадный CTC как у EasyOCR: [(text, conf)]; characters[0] — blank"""
+    probs = _softmax(logits.astype(np.float32))
+    if allowlist:
+        keep = np.zeros(len(characters), bool)
+        keep[0] = True
+        keep[[i for i, c in enumerate(characters) if c in allowlist]] = True
+        probs[..., ~keep] = 0
+        probs /= probs.sum(axis=-1, keepdims=True)
+    out = []
+    for p in probs:
+        idx = p.argmax(axis=-1)
+        text, prev = [], 0
+        for i in idx:
+            if i != 0 and i != prev:
+                text.append(characters[i])
+            prev = i
+        best = p.max(axis=-1)[idx != 0]
+        conf = float(best.prod() ** (2.0 / math.sqrt(len(best)))) if len(best) else 0.0
+        out.append(("".join(text), conf))
+    return out
+
+class OnnxReader:
+    """Подмножество easyocr.Reader поверх onnxruntime"""
+
+    def __init__(self, directory=MODELS_DIR, threads=None):
+        meta = json.loads((Path(directory) / "meta.json").read_text(encoding="utf-8"))
+        self.characters = ["[blank]"] + list(meta["characters"])
+        self.img_h = meta.get("imgH", 64)
+        self.threads = threads or THREADS or _default_threads()
+        self.detector = _session(model_path("detector", directory), self.threads)
+        self.recognizer = _session(model_path("recognizer", directory), self.threads)
+
+    @staticmethod
+    def _gray(img):
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+    def detect(self, img):
+        """[[x1, x2, y1, y2], ...] строк текста"""
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        canvas, ratio = _resize_for_detector(img)
+        x = ((canvas - MEAN) / STD).transpose(2, 0, 1)[None].astype(np.float32)
+        y = self.detector.run(None, {self.detector.get_inputs()[0].name: x})[0][0]
+        # карта в 2 раза меньше входа детектора
+        return group_boxes(detection_boxes(y[..., 0], y[..., 1], 2 / ratio))
+
+    def _crops(self, gray, boxes):
+        H, W = gray.shape[:2]
+        crops = []
+        for x1, x2, y1, y2 in boxes:
+            crop = gray[max(0, y1):min(H, y2), max(0, x1):min(W, x2)]
+            if crop.size == 0:
+                crops.append(None)
+                continue
+            w = max(1, min(int(math.ceil(self.img_h * crop.shape[1] / crop.shape[0])), 4096))
+            crops.append(cv2.resize(crop, (w, self.img_h), interpolation=cv2.INTER_CUBIC))
+        return crops
+
+    def _recognize_crops(self, crops, allowlist=None, batch_size=8):
+        order = sorted((i for i, c in enumerate(crops) if c is not None), key=lambda i: crops[i].shape[1])
+        results = [("", 0.0)] * len(crops)
+        for start in range(0, len(order), max(1, batch_size)):
+            ids = order[start:start + max(1, batch_size)]
+            width = max(crops[i].shape[1] for i in ids)
+            batch = np.empty((len(ids), 1, self.img_h, width), np.float32)
+            for j, i in enumerate(ids):
+                c = (crops[i].astype(np.float32) / 255 - 0.5) / 0.5
+                batch[j, 0, :, :c.shape[1]] = c
+                # как NormalizePAD в EasyOCR: хвост заполняется последним столбцом
+                batch[j, 0, :, c.shape[1]:] = c[:, -1:]
+            logits = self.recognizer.run(None, {self.recognizer.get_inputs()[0].name: batch})[0]
+            for i, res in zip(ids, ctc_decode(logits, self.characters, allowlist)):
+                results[i] = res
+        return results
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, allowlist=None,
+                  batch_size=8, **kwargs):
+        boxes = [[int(v) for v in b] for b in horizontal_list or []]
+        texts = self._recognize_crops(self._crops(self._gray(img), boxes), allowlist, batch_size)
+        out = [([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], text, conf)
+               for (x1, x2, y1, y2), (text, conf) in zip(boxes, texts)]
+        return [r[1] for r in out] if detail == 0 else out
+
+    def readtext(self, img, detail=1, paragraph=False, allowlist=None, batch_size=8, **kwargs):
+        res = self.recognize(img, horizontal_list=self.detect(img), detail=1, allowlist=allowlist,
+                             batch_size=batch_size)
+        res = [r for r in res if r[1]]
+        return [r[1] for r in res] if detail == 0 else res
+
+def export(out=MODELS_DIR, quantize=False, opset=17):
+    """Экспорт моделей EasyOCR (нужны easyocr и torch) в ONNX; quantize — ещё и int8 веса"""
+    import torch
+    from badge_presence import _local_reader
+    reader = _local_reader()
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    class Detector(torch.nn.Module):
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, x):
+            return self.net(x)[0]
+
+    class Recognizer(torch.nn.Module):
+        def __init__(self, net):
+            super().__init__()
+            self.net = net
+
+        def forward(self, x):
+            return self.net(x, None)
+
+    detector = getattr(reader.detector, "module", reader.detector).eval()
+    recognizer = getattr(reader.recognizer, "module", reader.recognizer).eval()
+    with torch.no_grad():
+        torch.onnx.export(Detector(detector), torch.randn(1, 3, 480, 640), str(out / "detector.onnx"),
+                          input_names=["image"], output_names=["maps"], opset_version=opset,
+                          dynamic_axes={"image": {2: "h", 3: "w"}, "maps": {1: "h2", 2: "w2"}})
+        torch.onnx.export(Recognizer(recognizer), torch.randn(1, 1, 64, 256), str(out / "recognizer.onnx"),
+                          input_names=["crops"], output_names=["logits"], opset_version=opset,
+                          dynamic_axes={"crops": {0: "batch", 3: "w"}, "logits": {0: "batch", 1: "t"}})
+    (out / "meta.json").write_text(json.dumps({"characters": reader.character, "imgH": 64,
+                                               "lang_list": getattr(reader, "lang_list", None)},
+                                              ensure_ascii=False), encoding="utf-8")
+    print(f"💾 ONNX models -> {out}")
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        for name in ("detector", "recognizer"):
+            quantize_dynamic(str(out / f"{name}.onnx"), str(out / f"{name}_int8.onnx"), weight_type=QuantType.QUInt8)
+        print("💾 int8 models -> " + ", ".join(f"{n}_int8.onnx" for n in ("detector", "recognizer")))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--export", action="store_true", help="экспортировать модели EasyOCR в ONNX")
+    ap.add_argument("--quantize", action="store_true", help="вместе с --export: int8 веса")
+    ap.add_argument("--dir", default=str(MODELS_DIR))
+    ap.add_argument("--image", help="распознать текст на скриншоте и показать тайминги")
+    args = ap.parse_args()
+    if args.export:
+        export(args.dir, args.quantize)
+    if args.image:
+        img = cv2.imread(args.image)
+        if img is None:
+            raise SystemExit(f"no image at {args.image}")
+        t0 = time.perf_counter()
+        reader = OnnxReader(args.dir)
+        t1 = time.perf_counter()
+        res = reader.readtext(img)
+        t2 = time.perf_counter()
+        for quad, text, conf in res:
+            print(f"{text:>20s}  conf={conf:.2f}  at {quad[0]}")
+        print(f"load={1000 * (t1 - t0):.0f}ms readtext={1000 * (t2 - t1):.0f}ms threads={reader.threads} "
+              f"models={model_path('detector', args.dir).name}, {model_path('recognizer', args.dir).name}")
+
+if __name__ == "__main__":
+    main()
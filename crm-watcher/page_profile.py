@@ -0,0 +1,162 @@
+"""
+Облегчённый профиль страницы для мониторинга: блокировка лишних ресурсов через route,
+отключённые анимации и отчёт о сэкономленных запросах/трафике.
+
+Размер заблокированного ресурса берётся из последней загрузки того же URL
+(cache/resource_sizes.json пополняется при запусках с CRM_BLOCK_RESOURCES= и CRM_BLOCK_THIRD_PARTY=0).
+
+Картинки и шрифты по умолчанию грузятся: без них даты и цифры badge рисуются иначе, чем на
+корпусе скриншотов, шаблонах цифр и в кешах раскладки/кадров.
+
+Настройки города (необязательные):
+    "allow_domains": ["cdn.example.com"]      — сторонние домены, которые нужны дашборду
+    "block_resource_types": ["font", "image"] — дополнительно блокировать для этого города
+    "allow_resource_types": ["media"]         — типы, которые для этого города не блокируем
+"""
+
+import os, json
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).parent
+SIZES_PATH = ROOT / "cache" / "resource_sizes.json"
+
+# Типы ресурсов Playwright, которые не влияют на вид календаря и badge
+BLOCK_TYPES = {t.strip() for t in os.getenv("CRM_BLOCK_RESOURCES", "media").split(",") if t.strip()}
+BLOCK_THIRD_PARTY = os.getenv("CRM_BLOCK_THIRD_PARTY", "1") == "1"
+
+# Без анимаций и переходов кадр устаканивается сразу
+NO_ANIMATIONS_JS = """
+(() => {
+  const css = '*,*::before,*::after{animation:none!important;transition:none!important;caret-color:transparent!important}';
+  const add = () => { const s = document.createElement('style'); s.textContent = css; document.documentElement.appendChild(s); };
+  if (document.documentElement) add(); else document.addEventListener('DOMContentLoaded', add);
+})();
+"""
+
+# Сколько URL помнить в cache/resource_sizes.json (самые давние вытесняются)
+MAX_SIZES = int(os.getenv("CRM_RESOURCE_SIZES_MAX", "2000"))
+
+_sizes = None
+
+def _known_sizes():
+    global _sizes
+    if _sizes is None:
+        try:
+            _sizes = json.loads(SIZES_PATH.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            _sizes = {}
+    return _sizes
+
+def _remember_size(key, size):
+    sizes = _known_sizes()
+    sizes.pop(key, None)
+    sizes[key] = size
+    while len(sizes) > MAX_SIZES:
+        del sizes[next(iter(sizes))]
+
+def save_sizes():
+    if _sizes is None:
+        return
+    try:
+        SIZES_PATH.parent.mkdir(parents=True, exist_ok=True)
+        SIZES_PATH.write_text(json.dumps(_sizes), encoding="utf-8")
+    except OSError as e:
+        print(f"WARN: cannot save resource sizes: {e}")
+
+def _url_key(url):
+    u = urlparse(url)
+    return f"{u.hostname}{u.path}"
+
+def _site(host):
+    """Последние два уровня домена: crm.example.com -> example.com"""
+    parts = (host or "").split(".")
+    return ".".join(parts[-2:])
+
+class PageProfile:
+    """Подключается к контексту города; считает заблокированные и загруженные запросы"""
+
+    def __init__(self, config):
+        self.sites = {_site(urlparse(config[k]).hostname) for k in ("crm_url", "crm_dashboard") if config.get(k)}
+        self.allow_domains = set(config.get("allow_domains", []))
+        self.block_types = ((BLOCK_TYPES | set(config.get("block_resource_types", [])))
+                            - set(config.get("allow_resource_types", [])))
+        self.blocked = Counter()          # тип ресурса -> запросов
+        self.blocked_hosts = Counter()
+        self.saved_bytes = 0
+        self.unknown_size = 0
+        self.loaded = 0
+        self.loaded_bytes = 0
+
+    @staticmethod
+    def context_options():
+        return {"reduced_motion": "reduce"}
+
+    async def apply(self, ctx):
+        await ctx.add_init_script(NO_ANIMATIONS_JS)
+        if self.block_types or BLOCK_THIRD_PARTY:
+            await ctx.route("**/*", self._route)
+        ctx.on("response", self._on_response)
+
+    def _third_party(self, host):
+        if not host or _site(host) in self.sites:
+            return False
+        return not any(host == d or host.endswith("." + d) for d in self.allow_domains)
+
+    def should_block(self, url, resource_type):
+        if resource_type == "document":
+            return False
+        if resource_type in self.block_types:
+            return True
+        return BLOCK_THIRD_PARTY and self._third_party(urlparse(url).hostname)
+
+    async def _route(self, route):
+        req = route.request
+        if self.should_block(req.url, req.resource_type):
+            self.blocked[req.resource_type] += 1
+            self.blocked_hosts[urlparse(req.url).hostname or ""] += 1
+            size = _known_sizes().get(_url_key(req.url))
+            if size is None:
+                self.unknown_size += 1
+            else:
+                self.saved_bytes += size
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    def _on_response(self, res):
+        self.loaded += 1
+        try:
+            size = int(res.headers.get("content-length") or 0)
+        except ValueError:
+            return
+        self.loaded_bytes += size
+        if size:
+            _remember_size(_url_key(res.url), size)
+
+    def report(self):
+        return {
+            "blocked": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "blocked_hosts": dict(self.blocked_hosts.most_common(5)),
+            "saved_kb": round(self.saved_bytes / 1024, 1),
+            "blocked_unknown_size": self.unknown_size,
+            "loaded": self.loaded,
+            "loaded_kb": round(self.loaded_bytes / 1024, 1),
+        }
+
+def merge_reports(reports):
+    """Суммарный отчёт за запуск по всем городам"""
+    total = {"blocked": 0, "blocked_by_type": Counter(), "blocked_hosts": Counter(),
+             "saved_kb": 0.0, "blocked_unknown_size": 0, "loaded": 0, "loaded_kb": 0.0}
+    for r in reports:
+        for k in ("blocked", "saved_kb", "blocked_unknown_size", "loaded", "loaded_kb"):
+            total[k] += r[k]
+        total["blocked_by_type"].update(r["blocked_by_type"])
+        total["blocked_hosts"].update(r["blocked_hosts"])
+    total["blocked_by_type"] = dict(total["blocked_by_type"])
+    total["blocked_hosts"] = dict(total["blocked_hosts"].most_common(5))
+    total["saved_kb"] = round(total["saved_kb"], 1)
+    total["loaded_kb"] = round(total["loaded_kb"], 1)
+    return total
@@ -0,0 +1,58 @@
+"""
+Расписание проверок для режима --daemon: по часовому поясу города и notification_hours,
+с учётом перехода на летнее/зимнее время и случайным сдвигом (jitter)
+"""
+
+import os, random, datetime as dt
+from zoneinfo import ZoneInfo
+
+UTC = dt.timezone.utc
+
+# Случайный сдвиг старта проверки, секунд (чтобы города не били в CRM одновременно)
+JITTER_SECONDS = int(os.getenv("CRM_SCHEDULE_JITTER", "60"))
+
+def _local_slot(day, hour, minute, tz):
+    """Локальное время слота в UTC; None, если такого времени нет (переход на летнее время)"""
+    local = dt.datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+    utc = local.astimezone(UTC)
+    if utc.astimezone(tz).replace(tzinfo=None) != local.replace(tzinfo=None):
+        return None
+    return utc
+
+def in_notification_hours(config, now_utc=None):
+    """Локальный час города сейчас — в notification_hours (только тогда одиночный запуск может прислать алерт)"""
+    now_utc = now_utc or dt.datetime.now(UTC)
+    return now_utc.astimezone(ZoneInfo(config["timezone"])).hour in config.get("notification_hours", [])
+
+def next_alert_slot(config, now_utc):
+    """Ближайшее (строго после now_utc) время проверки в часы уведомлений города"""
+    tz = ZoneInfo(config["timezone"])
+    minute = int(config.get("check_minute", 0))
+    today = now_utc.astimezone(tz).date()
+    slots = []
+    for offset in range(0, 3):
+        day = today + dt.timedelta(days=offset)
+        for hour in config["notification_hours"]:
+            slot = _local_slot(day, hour, minute, tz)
+            if slot is not None and slot > now_utc:
+                slots.append(slot)
+        if slots:
+            break
+    return min(slots) if slots else None
+
+def next_run(config, now_utc=None, jitter=JITTER_SECONDS):
+    """
+    Следующий запуск проверки для города (UTC).
+    poll_interval_minutes в конфиге — дополнительный опрос между часами уведомлений.
+    """
+    now_utc = now_utc or dt.datetime.now(UTC)
+    candidates = []
+    slot = next_alert_slot(config, now_utc)
+    if slot is not None:
+        candidates.append(slot)
+    poll = config.get("poll_interval_minutes")
+    if poll:
+        candidates.append(now_utc + dt.timedelta(minutes=float(poll)))
+    if not candidates:
+        return None
+    return min(candidates) + dt.timedelta(seconds=random.uniform(0, jitter) if jitter else 0)
@@ -0,0 +1,73 @@
+"""
+Кеш сессий CRM: storage_state (куки + localStorage) отдельно для каждого города
+"""
+
+import os, json, time, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+SESSIONS_DIR = ROOT / "sessions"
+
+# Сессии, не подтверждённые дольше этого срока, не используем — сразу логинимся заново
+# (файл перезаписывается после каждой проверки, на которой сессия сработала)
+MAX_AGE_HOURS = float(os.getenv("CRM_SESSION_MAX_AGE_HOURS", "72"))
+
+class SessionCache:
+    def __init__(self, root=SESSIONS_DIR, max_age_hours=MAX_AGE_HOURS):
+        self.root = Path(root)
+        self.max_age = max_age_hours * 3600
+
+    def path(self, key):
+        return self.root / f"storage_state_{key}.json"
+
+    def load(self, key):
+        """Путь к сохранённому storage_state или None, если его нет/он испорчен/устарел"""
+        p = self.path(key)
+        if not p.exists():
+            return None
+        if time.time() - p.stat().st_mtime > self.max_age:
+            print(f"[session:{key}] Saved session is older than {self.max_age/3600:.0f}h — ignoring")
+            return None
+        try:
+            json.loads(p.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"[session:{key}] Broken session file, removing: {e}")
+            self.invalidate(key)
+            return None
+        return str(p)
+
+    def stamp(self, key):
+        """mtime файла сессии (меняется при каждом сохранении) или None"""
+        try:
+            return self.path(key).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def cookies(self, key):
+        """Куки из сохранённого storage_state — для контекста, открытого со старой сессией"""
+        try:
+            return json.loads(self.path(key).read_text(encoding="utf-8")).get("cookies", [])
+        except (FileNotFoundError, ValueError):
+            return []
+
+    async def save(self, key, ctx):
+        """Атомарно сохраняет состояние контекста (tmp-файл + os.replace)"""
+        state = await ctx.storage_state()
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{key}.", suffix=".tmp", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.path(key))
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        print(f"[session:{key}] Session saved")
+
+    def invalidate(self, key):
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,127 @@
+"""
+Асинхронная отправка в Telegram: одна пул-сессия HTTP, параллельная отправка по чатам,
+учёт retry_after на 429 и повторное использование file_id для одной и той же картинки
+"""
+
+import os, asyncio, hashlib
+from collections import OrderedDict
+import aiohttp
+
+# Можно направить на локальную заглушку Bot API (для тестов/нагрузки)
+API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# Сколько последних картинок помнить по file_id (в режиме демона картинки не повторяются бесконечно)
+FILE_ID_CACHE = int(os.getenv("TELEGRAM_FILE_ID_CACHE", "64"))
+
+def parse_chat_ids(value):
+    """"-100,-200" / ["-100", "-200"] / "-100" -> список chat_id"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+class TelegramError(Exception):
+    pass
+
+class TelegramSender:
+    def __init__(self, token, api_base=API_BASE, max_concurrency=4, max_retries=3, timeout=30):
+        self.token = token
+        self.api_base = api_base.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._limit = max_concurrency
+        self._session = None
+        self._file_ids = OrderedDict()
+        self._upload_locks = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self._limit),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _call(self, method, fields, photo=None):
+        """POST в Bot API с повторами: 429 — ждём retry_after, 5xx/сеть — экспоненциальная пауза"""
+        url = f"{self.api_base}/bot{self.token}/{method}"
+        for attempt in range(1, self.max_retries + 1):
+            form = aiohttp.FormData()
+            for k, v in fields.items():
+                form.add_field(k, str(v))
+            if photo is not None:
+                form.add_field("photo", photo, filename="dashboard.png", content_type="image/png")
+            try:
+                async with self._sem:
+                    async with self._get_session().post(url, data=form) as r:
+                        status = r.status
+                        try:
+                            data = await r.json(content_type=None)
+                        except ValueError:
+                            # Не JSON: страница ошибки прокси/балансировщика — решаем по статусу
+                            text = await r.text(errors="replace")
+                            data = {"description": text[:200]}
+                        if not isinstance(data, dict):
+                            data = {"description": str(data)[:200]}
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise TelegramError(f"{method} failed: {e}") from e
+                await asyncio.sleep(2 ** attempt)
+                continue
+            if data.get("ok"):
+                return data["result"]
+            if status == 429 and attempt < self.max_retries:
+                wait = (data.get("parameters") or {}).get("retry_after", 1)
+                print(f"Telegram rate limit — retry after {wait}s")
+                await asyncio.sleep(wait)
+                continue
+            if status >= 500 and attempt < self.max_retries:
+                await asyncio.sleep(2 ** attempt)
+                continue
+            raise TelegramError(f"{method} error {status}: {data.get('description')}")
+
+    async def send_photo(self, chat_id, photo, caption=""):
+        """Отправляет PNG байты; одинаковую картинку загружает один раз, дальше — по file_id"""
+        key = hashlib.sha1(photo).hexdigest()
+        lock = self._upload_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                file_id = self._file_ids.get(key)
+                if file_id is None:
+                    result = await self._call("sendPhoto", {"chat_id": chat_id, "caption": caption}, photo=photo)
+                    self._file_ids[key] = result["photo"][-1]["file_id"]
+                    while len(self._file_ids) > FILE_ID_CACHE:
+                        self._file_ids.popitem(last=False)
+                    return result
+                self._file_ids.move_to_end(key)
+        finally:
+            # Блокировка нужна только пока идёт загрузка; дальше хватает file_id
+            if not lock.locked() and self._upload_locks.get(key) is lock:
+                del self._upload_locks[key]
+        return await self._call("sendPhoto", {"chat_id": chat_id, "caption": caption, "photo": file_id})
+
+    async def send_photo_to_chats(self, chat_ids, photo, caption=""):
+        """Параллельно во все чаты; возвращает {chat_id: True/False}"""
+        results = await asyncio.gather(*(self.send_photo(c, photo, caption) for c in chat_ids),
+                                       return_exceptions=True)
+        out = {}
+        for chat_id, res in zip(chat_ids, results):
+            if isinstance(res, Exception):
+                print(f"Telegram error for chat {chat_id}: {res}")
+            out[chat_id] = not isinstance(res, Exception)
+        return out
+
+    async def send_message(self, chat_id, text):
+        return await self._call("sendMessage", {"chat_id": chat_id, "text": text})